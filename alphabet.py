@@ -0,0 +1,476 @@
+"""
+alphabet.py
+Character classes, regex tokens and symbol equivalence classes (byte classes)
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from bisect import bisect_right
+
+EPSILON = 'ε'
+MAX_CODE_POINT = 0x10FFFF
+# Characters the symbol class lookup remembers after classifying them with a binary search
+MAX_REMEMBERED_CHARACTERS = 1 << 16
+OPERATOR_CHARACTERS = '*+?.|(){}'
+# Characters written with a backslash when describing a class
+SPECIAL_CHARACTERS = OPERATOR_CHARACTERS + '[]\\^-' + EPSILON
+
+
+class RegexSyntaxError(ValueError):
+    """
+    Raised when a regular expression can not be read
+    """
+
+    def __init__(self, message, position):
+        super().__init__(f'{message} (posición {position})')
+        self.message = message
+        self.position = position
+
+
+def normalize_intervals(intervals):
+    """
+    Sorts code point intervals and joins the ones that overlap or touch
+    :param intervals: iterable of (first, last) code points
+    :return: tuple of disjoint (first, last) intervals in increasing order
+    """
+    merged = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return tuple(merged)
+
+
+def intersect_intervals(intervals1, intervals2):
+    """
+    Intersection of two normalized interval tuples
+    :param intervals1: intervals
+    :param intervals2: intervals
+    :return: intervals in both
+    """
+    intersection = []
+    index1 = index2 = 0
+    while index1 < len(intervals1) and index2 < len(intervals2):
+        first = max(intervals1[index1][0], intervals2[index2][0])
+        last = min(intervals1[index1][1], intervals2[index2][1])
+        if first <= last:
+            intersection.append((first, last))
+        if intervals1[index1][1] < intervals2[index2][1]:
+            index1 += 1
+        else:
+            index2 += 1
+    return tuple(intersection)
+
+
+def subtract_intervals(intervals, removed_intervals):
+    """
+    Difference of two normalized interval tuples
+    :param intervals: intervals
+    :param removed_intervals: intervals taken out
+    :return: intervals
+    """
+    difference = []
+    index = 0
+    for first, last in intervals:
+        while index < len(removed_intervals) and removed_intervals[index][1] < first:
+            index += 1
+        removed_index = index
+        while first <= last:
+            if removed_index >= len(removed_intervals) or removed_intervals[removed_index][0] > last:
+                difference.append((first, last))
+                break
+            removed_first, removed_last = removed_intervals[removed_index]
+            if removed_first > first:
+                difference.append((first, removed_first - 1))
+            first = removed_last + 1
+            removed_index += 1
+    return tuple(difference)
+
+
+def describe_intervals(intervals):
+    """
+    Describes code point intervals compactly, runs of three or more characters are written as ranges (a-z)
+    :param intervals: normalized intervals
+    :return: description
+    """
+    description = []
+    for first, last in intervals:
+        if last - first >= 2:
+            description.append(escape_character(chr(first)) + '-' + escape_character(chr(last)))
+        else:
+            description.extend(escape_character(chr(code)) for code in range(first, last + 1))
+    return ''.join(description)
+
+
+def escape_character(character):
+    """
+    Escapes a character that has a meaning in the regex syntax
+    :param character: character
+    :return: escaped character
+    """
+    if character in SPECIAL_CHARACTERS:
+        return '\\' + character
+    return character
+
+
+class CharacterClass(object):
+    """
+    Set of characters matched by one regex operand, stored as sorted code point intervals. Negated classes
+    match every character not in the set
+    """
+
+    def __init__(self, characters, negated=False):
+        self.intervals = normalize_intervals((ord(character), ord(character)) for character in characters)
+        self.negated = negated
+
+    @classmethod
+    def from_intervals(cls, intervals, negated=False):
+        """
+        Builds a class from code point intervals
+        :param intervals: iterable of (first, last) code points
+        :param negated: if the class matches the characters outside of the intervals
+        :return: character class
+        """
+        character_class = cls('', negated)
+        character_class.intervals = normalize_intervals(intervals)
+        return character_class
+
+    def single_character(self):
+        """
+        Gets the only character the class matches
+        :return: character, None if the class matches several characters
+        """
+        if not self.negated and len(self.intervals) == 1 and self.intervals[0][0] == self.intervals[0][1]:
+            return chr(self.intervals[0][0])
+        return None
+
+    def __contains__(self, character):
+        code_point = ord(character)
+        index = bisect_right(self.intervals, (code_point, MAX_CODE_POINT)) - 1
+        return (index >= 0 and code_point <= self.intervals[index][1]) != self.negated
+
+    def __eq__(self, other):
+        return isinstance(other, CharacterClass) and self.intervals == other.intervals and \
+            self.negated == other.negated
+
+    def __hash__(self):
+        return hash((self.intervals, self.negated))
+
+    def __str__(self):
+        character = self.single_character()
+        if character is not None:
+            return escape_character(character)
+        return '[' + ('^' if self.negated else '') + describe_intervals(self.intervals) + ']'
+
+    def __repr__(self):
+        return f'CharacterClass({str(self)})'
+
+
+class Repetition(object):
+    """
+    Bounded repetition operator: r{m}, r{m,}, r{m,n} and r? (r{0,1})
+    """
+
+    def __init__(self, minimum, maximum=None):
+        self.minimum = minimum
+        # None when the repetition is unbounded
+        self.maximum = maximum
+
+    def __eq__(self, other):
+        return isinstance(other, Repetition) and self.minimum == other.minimum and self.maximum == other.maximum
+
+    def __hash__(self):
+        return hash((self.minimum, self.maximum))
+
+    def __str__(self):
+        if self.minimum == 0 and self.maximum == 1:
+            return '?'
+        if self.minimum == self.maximum:
+            return '{' + str(self.minimum) + '}'
+        return '{' + str(self.minimum) + ',' + ('' if self.maximum is None else str(self.maximum)) + '}'
+
+    def __repr__(self):
+        return f'Repetition({str(self)})'
+
+
+def parse_repetition(regex, position):
+    """
+    Reads a bounded repetition ({m}, {m,}, {m,n})
+    :param regex: regular expression
+    :param position: position of the opening brace
+    :return: repetition, position after the closing brace
+    """
+    end = regex.find('}', position)
+    if end == -1:
+        raise RegexSyntaxError('Repetición sin cerrar', position)
+    bounds = regex[position + 1:end].split(',')
+    valid_bounds = len(bounds) <= 2 and bounds[0].isdigit() and (len(bounds) == 1 or bounds[1] == '' or
+                                                                 bounds[1].isdigit())
+    if not valid_bounds:
+        raise RegexSyntaxError('Repetición inválida, use {m}, {m,} o {m,n}', position)
+    minimum = int(bounds[0])
+    if len(bounds) == 1:
+        maximum = minimum
+    else:
+        maximum = int(bounds[1]) if bounds[1] != '' else None
+    if maximum is not None and maximum < minimum:
+        raise RegexSyntaxError('Repetición inválida, el máximo es menor que el mínimo', position)
+    return Repetition(minimum, maximum), end + 1
+
+
+def as_character_class(identifier):
+    """
+    Gets the character class of a transition identifier (plain characters are single character classes)
+    :param identifier: CharacterClass or character
+    :return: character class
+    """
+    if isinstance(identifier, CharacterClass):
+        return identifier
+    return CharacterClass(identifier)
+
+
+def union_character_classes(character_classes):
+    """
+    Joins character classes in one class that matches every character matched by any of them
+    :param character_classes: iterable of character classes
+    :return: character class
+    """
+    included = []
+    excluded = None
+    for character_class in character_classes:
+        if character_class.negated:
+            excluded = character_class.intervals if excluded is None else \
+                intersect_intervals(excluded, character_class.intervals)
+        else:
+            included.extend(character_class.intervals)
+    if excluded is None:
+        return CharacterClass.from_intervals(included)
+    # A negated class stays negated, it only excludes what no class matches
+    return CharacterClass.from_intervals(subtract_intervals(excluded, normalize_intervals(included)), True)
+
+
+def parse_bracket_class(regex, position):
+    """
+    Reads a bracket class ([abc], [a-z], [^ab])
+    :param regex: regular expression
+    :param position: position of the opening bracket
+    :return: character class, position after the closing bracket
+    """
+    start = position
+    position += 1
+    negated = position < len(regex) and regex[position] == '^'
+    if negated:
+        position += 1
+
+    intervals = []
+    first = True
+    while True:
+        if position >= len(regex):
+            raise RegexSyntaxError('Clase de caracteres sin cerrar', start)
+        character = regex[position]
+        if character == ']' and not first:
+            return CharacterClass.from_intervals(intervals, negated), position + 1
+        first = False
+        if character == '\\':
+            if position + 1 >= len(regex):
+                raise RegexSyntaxError('Escape incompleto', position)
+            character = regex[position + 1]
+            position += 2
+        else:
+            position += 1
+
+        # Ranges (a-z), a '-' before the closing bracket is a literal
+        if position + 1 < len(regex) and regex[position] == '-' and regex[position + 1] != ']':
+            range_end = regex[position + 1]
+            position += 2
+            if range_end == '\\':
+                if position >= len(regex):
+                    raise RegexSyntaxError('Escape incompleto', position - 1)
+                range_end = regex[position]
+                position += 1
+            if ord(range_end) < ord(character):
+                raise RegexSyntaxError('Rango de caracteres inválido', position - 1)
+            intervals.append((ord(character), ord(range_end)))
+        else:
+            intervals.append((ord(character), ord(character)))
+
+
+def tokenize_regex(regex):
+    """
+    Splits a regex in tokens: operators and parenthesis as strings, bounded repetitions as Repetition,
+    operands as CharacterClass (ε stays as the epsilon string). '\\' escapes the next character
+    :param regex: regular expression
+    :return: list of (position, token)
+    """
+    tokens = []
+    position = 0
+    while position < len(regex):
+        character = regex[position]
+        if character == '\\':
+            if position + 1 >= len(regex):
+                raise RegexSyntaxError('Escape incompleto', position)
+            tokens.append((position, CharacterClass(regex[position + 1])))
+            position += 2
+        elif character == '[':
+            character_class, next_position = parse_bracket_class(regex, position)
+            tokens.append((position, character_class))
+            position = next_position
+        elif character == ']':
+            raise RegexSyntaxError('Corchete de cierre sin apertura', position)
+        elif character == '{':
+            repetition, next_position = parse_repetition(regex, position)
+            tokens.append((position, repetition))
+            position = next_position
+        elif character == '}':
+            raise RegexSyntaxError('Llave de cierre sin apertura', position)
+        elif character in OPERATOR_CHARACTERS or character == EPSILON:
+            tokens.append((position, character))
+            position += 1
+        else:
+            tokens.append((position, CharacterClass(character)))
+            position += 1
+    return tokens
+
+
+def is_operand(token):
+    """
+    Checks if a regex token is an operand
+    :param token: token
+    :return: True for character classes and ε
+    """
+    return isinstance(token, CharacterClass) or token == EPSILON
+
+
+class SymbolCodes(dict):
+    """
+    Character to symbol class code map, filled on lookup: a missing character is classified with a binary
+    search over the partition boundaries and remembered (up to MAX_REMEMBERED_CHARACTERS characters).
+    Engines index it directly, symbol_codes[character] is a plain dict lookup once a character was seen
+    """
+
+    def __init__(self, boundaries, segment_codes):
+        super().__init__()
+        self.boundaries = boundaries
+        self.segment_codes = segment_codes
+
+    def __missing__(self, character):
+        code = self.segment_codes[bisect_right(self.boundaries, ord(character)) - 1]
+        if len(self) < MAX_REMEMBERED_CHARACTERS:
+            self[character] = code
+        return code
+
+
+class SymbolClasses(object):
+    """
+    Partition of the characters in equivalence classes: characters that every character class of an
+    automaton treats the same way share one class (one transition table column). The partition is stored
+    as code point segments, so its size depends on the number of interval boundaries, not on the alphabet
+    """
+
+    def __init__(self, boundaries, segment_codes, class_count, default_class=None):
+        # Segment i holds the code points from boundaries[i] (the first one is 0) to the next boundary, its
+        # characters belong to class segment_codes[i] (None when no transition can use them)
+        self.boundaries = list(boundaries)
+        self.segment_codes = list(segment_codes)
+        self.class_count = class_count
+        # Class of the characters no character class lists (None if they are not matched)
+        self.default_class = default_class
+        self.class_of = SymbolCodes(self.boundaries, self.segment_codes)
+
+        # Code point intervals of each class
+        self.columns = [[] for _ in range(class_count)]
+        for index, code in enumerate(self.segment_codes):
+            if code is not None:
+                last = self.boundaries[index + 1] - 1 if index + 1 < len(self.boundaries) else MAX_CODE_POINT
+                self.columns[code].append((self.boundaries[index], last))
+
+        self.labels = []
+        for code, column in enumerate(self.columns):
+            if code == default_class:
+                self.labels.append(str(CharacterClass.from_intervals(
+                    subtract_intervals(((0, MAX_CODE_POINT),), tuple(column)), True)))
+            else:
+                self.labels.append(str(CharacterClass.from_intervals(column)))
+
+    @classmethod
+    def from_character_classes(cls, character_classes):
+        """
+        Builds the coarsest partition that keeps every character class a union of classes. The classes a
+        code point belongs to only change at interval boundaries, so the code points are swept from boundary
+        to boundary
+        :param character_classes: character classes used by an automaton
+        :return: symbol classes
+        """
+        character_classes = list(dict.fromkeys(character_classes))
+        # Classes that match the characters outside of every interval
+        unlisted_signature = frozenset(index for index, character_class in enumerate(character_classes)
+                                       if character_class.negated)
+
+        # Classes whose membership flips at each boundary (intervals are disjoint and do not touch)
+        toggles = {}
+        for index, character_class in enumerate(character_classes):
+            for first, last in character_class.intervals:
+                toggles.setdefault(first, []).append(index)
+                toggles.setdefault(last + 1, []).append(index)
+
+        boundaries = [0]
+        signatures = [unlisted_signature]
+        inside = set()
+        for boundary in sorted(toggles):
+            inside.symmetric_difference_update(toggles[boundary])
+            if boundary > MAX_CODE_POINT:
+                break
+            signature = unlisted_signature.symmetric_difference(inside)
+            if boundary == 0:
+                signatures[0] = signature
+            else:
+                boundaries.append(boundary)
+                signatures.append(signature)
+
+        # Codes in order of the first character of each class, the default class goes last
+        codes = {}
+        for signature in signatures:
+            if signature and signature != unlisted_signature and signature not in codes:
+                codes[signature] = len(codes)
+        default_class = None
+        if unlisted_signature:
+            default_class = len(codes)
+            codes[unlisted_signature] = default_class
+
+        merged_boundaries = []
+        segment_codes = []
+        for boundary, signature in zip(boundaries, signatures):
+            code = codes.get(signature)
+            if not segment_codes or segment_codes[-1] != code:
+                merged_boundaries.append(boundary)
+                segment_codes.append(code)
+        return cls(merged_boundaries, segment_codes, len(codes), default_class)
+
+    def classify(self, character):
+        """
+        Gets the class of a character
+        :param character: character
+        :return: class code, None if no transition can use the character
+        """
+        return self.class_of[character]
+
+    def class_contains(self, code, character_class):
+        """
+        Checks if a class is part of a character class
+        :param code: class code
+        :param character_class: character class used to build the partition
+        :return: True if every character of the class belongs to the character class
+        """
+        column = self.columns[code]
+        if len(column) > 0:
+            return chr(column[0][0]) in character_class
+        return character_class.negated
+
+    def codes_in(self, character_class):
+        """
+        Gets the classes that form a character class
+        :param character_class: character class used to build the partition
+        :return: list of class codes
+        """
+        return [code for code in range(self.class_count) if self.class_contains(code, character_class)]
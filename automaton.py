@@ -4,11 +4,25 @@ Automaton logic and building for the Automaton program
 Pablo Ruiz 18259 (PingMaster99)
 """
 
+from array import array
+from collections import deque
+from copy import copy
 from dataStructures import State
-import networkx as nx
-import matplotlib.pyplot as plt
-import pylab
-from dataStructures import DirectConstructionNode, shunting_yard_algorithm
+from dataStructures import bitset_indexes
+from regexParser import parse_regex
+from compiledAutomaton import CompiledDFA, DEAD_STATE, TRANSITION_TYPECODE
+from alphabet import SymbolClasses, CharacterClass, Repetition, as_character_class, EPSILON
+from nfaSimulation import BitParallelNFA
+from lazyDfa import LazyDFA, DEFAULT_MAX_STATES
+from batchMatching import match_many, DEFAULT_CHUNK_SIZE
+from parallelMatching import ParallelDFA, DEFAULT_PARALLEL_CHUNK_SIZE
+from automatonStats import phase
+from compactNfa import CompactNFA, NO_EDGE, indexes_to_bitset
+from automatonExport import export_automaton
+from literalPrefilter import LiteralPrefilter
+
+# Most states an automaton generator builds (expanded Thompson NFA, subset or direct DFA)
+DEFAULT_STATE_BUDGET = 250000
 
 
 class FiniteAutomaton(object):
@@ -17,10 +31,265 @@ class FiniteAutomaton(object):
     """
 
     def __init__(self, initial_state, acceptance_states, is_deterministic=False):
-        self.initial_state = initial_state
-        self.acceptance_states = acceptance_states
-        self.states = []
+        self.linked_initial_state = initial_state
+        self.linked_acceptance_states = acceptance_states
+        self.linked_states = []
+        # Struct-of-arrays NFA, the State graph of compact automatons is only built when it is needed
+        self.compact = None
         self.is_deterministic = is_deterministic
+        self.compiled = None
+        self.state_indexes = None
+        self.closure_table = None
+        # Closures of state sets, flushed when it holds closure_cache_size sets (the lazy DFA state budget)
+        self.closure_cache = {}
+        self.closure_cache_size = DEFAULT_MAX_STATES
+        self.simulation = None
+        self.lazy_simulation = None
+        # Symbol equivalence classes (set by the DFA builders, computed from the transitions for NFAs)
+        self.alphabet = None
+        # Optional AutomatonStats, set by the builder that created the automaton
+        self.stats = None
+        # LiteralPrefilter of the regex (None if it has no literals or the automaton joins several rules)
+        self.prefilter = None
+
+    @classmethod
+    def from_compact(cls, compact):
+        """
+        Wraps a compact NFA, its State graph is linked on first access (display)
+        :param compact: compact NFA
+        :return: NFA
+        """
+        automaton = cls(None, None)
+        automaton.linked_states = None
+        automaton.compact = compact
+        return automaton
+
+    def link_compact_states(self):
+        """
+        Builds the State graph of a compact NFA
+        """
+        if self.linked_states is None:
+            self.linked_states, self.linked_initial_state, self.linked_acceptance_states = self.compact.link_states()
+
+    @property
+    def states(self):
+        """
+        States of the automaton
+        """
+        self.link_compact_states()
+        return self.linked_states
+
+    @states.setter
+    def states(self, states):
+        self.linked_states = states
+
+    @property
+    def initial_state(self):
+        """
+        Initial state of the automaton
+        """
+        self.link_compact_states()
+        return self.linked_initial_state
+
+    @initial_state.setter
+    def initial_state(self, initial_state):
+        self.linked_initial_state = initial_state
+
+    @property
+    def acceptance_states(self):
+        """
+        Acceptance states of the automaton
+        """
+        self.link_compact_states()
+        return self.linked_acceptance_states
+
+    @acceptance_states.setter
+    def acceptance_states(self, acceptance_states):
+        self.linked_acceptance_states = acceptance_states
+
+    @property
+    def state_count(self):
+        """
+        Number of states (without linking a compact NFA)
+        """
+        if self.linked_states is None:
+            return self.compact.state_count
+        return len(self.linked_states)
+
+    def compact_nfa(self):
+        """
+        Gets (once) the struct-of-arrays form of an NFA, the engines run on it
+        :return: compact NFA
+        """
+        if self.compact is None:
+            self.compact = CompactNFA.from_states(self.states, self.initial_state, self.acceptance_states)
+        return self.compact
+
+    def compile(self):
+        """
+        Compiles a deterministic automaton into an array-backed transition table.
+        The State graph is kept for display()
+        :return: compiled DFA
+        """
+        if self.compiled is None:
+            self.compiled = CompiledDFA.from_automaton(self)
+        return self.compiled
+
+    def symbol_classes(self):
+        """
+        Gets the symbol equivalence classes of the automaton: characters every transition treats the same way
+        share one class
+        :return: symbol classes
+        """
+        if self.alphabet is None and not self.is_deterministic:
+            self.alphabet = SymbolClasses.from_character_classes(self.compact_nfa().character_classes)
+        elif self.alphabet is None:
+            self.alphabet = SymbolClasses.from_character_classes(
+                as_character_class(identifier) for state in self.states
+                for identifier, _ in state.transitions() if identifier != EPSILON)
+        return self.alphabet
+
+    def index_states(self):
+        """
+        Numbers the automaton states by their position in the states list
+        :return: dictionary from id(state) to state number
+        """
+        if self.state_indexes is None:
+            self.state_indexes = {id(state): index for index, state in enumerate(self.states)}
+        return self.state_indexes
+
+    def states_to_bitset(self, states):
+        """
+        Converts an iterable of states to an integer bitset
+        :param states: states
+        :return: bitset
+        """
+        state_indexes = self.index_states()
+        bitset = 0
+        for state in states:
+            bitset |= 1 << state_indexes[id(state)]
+        return bitset
+
+    def bitset_to_states(self, bitset):
+        """
+        Converts an integer bitset to a set of states
+        :param bitset: bitset
+        :return: set with the states
+        """
+        return {self.states[index] for index in bitset_indexes(bitset)}
+
+    def epsilon_closure_table(self):
+        """
+        Computes (once) the epsilon closure of every state as an offset bitset: the lowest state of the
+        closure and a bitset relative to it, so a closure takes the span of states it covers (not every
+        state number below it).
+        Strongly connected components are resolved iteratively (Tarjan), so epsilon cycles and long
+        chains do not recurse
+        :return: (array with the lowest state of each closure, list with the relative closure bitsets)
+        """
+        if self.closure_table is not None:
+            return self.closure_table
+
+        compact = self.compact_nfa()
+        state_count = compact.state_count
+        # Each state has at most two ε successors
+        successors = compact.epsilon_edges()
+
+        closure_lows = array(TRANSITION_TYPECODE, [0]) * state_count
+        closure_bits = [0] * state_count
+        order = array(TRANSITION_TYPECODE, [-1]) * state_count
+        low_link = array(TRANSITION_TYPECODE, [0]) * state_count
+        on_stack = bytearray(state_count)
+        component_stack = []
+        counter = 0
+
+        for root in range(state_count):
+            if order[root] != -1:
+                continue
+            order[root] = low_link[root] = counter
+            counter += 1
+            component_stack.append(root)
+            on_stack[root] = 1
+            work = [[root, 0]]
+
+            while work:
+                frame = work[-1]
+                node = frame[0]
+                if frame[1] < 2:
+                    child = successors[frame[1]][node]
+                    frame[1] += 1
+                    if child == NO_EDGE:
+                        continue
+                    if order[child] == -1:
+                        order[child] = low_link[child] = counter
+                        counter += 1
+                        component_stack.append(child)
+                        on_stack[child] = 1
+                        work.append([child, 0])
+                    elif on_stack[child]:
+                        low_link[node] = min(low_link[node], order[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+
+                # Node is the root of a component: every component it reaches is already resolved
+                if low_link[node] == order[node]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    children = [child for member in component
+                                for child in (successors[0][member], successors[1][member]) if child != NO_EDGE]
+                    low = min(min(component), min((closure_lows[child] for child in children), default=state_count))
+                    closure = 0
+                    for member in component:
+                        closure |= 1 << (member - low)
+                    for child in children:
+                        closure |= closure_bits[child] << (closure_lows[child] - low)
+                    for member in component:
+                        closure_lows[member] = low
+                        closure_bits[member] = closure
+
+        self.closure_table = (closure_lows, closure_bits)
+        return self.closure_table
+
+    def state_closure(self, index):
+        """
+        Epsilon closure of one state
+        :param index: state number
+        :return: closure bitset
+        """
+        closure_lows, closure_bits = self.epsilon_closure_table()
+        return closure_bits[index] << closure_lows[index]
+
+    def closure_of_bitset(self, bitset):
+        """
+        Epsilon closure of a set of states (cached by bitset, the cache is emptied when it is full)
+        :param bitset: states bitset
+        :return: closure bitset
+        """
+        closure = self.closure_cache.get(bitset)
+        if closure is None:
+            closure_lows, closure_bits = self.epsilon_closure_table()
+            closure = 0
+            pending = bitset
+            while pending:
+                index = (pending & -pending).bit_length() - 1
+                closure |= closure_bits[index] << closure_lows[index]
+                # The closure of a state contains the closures of its members, those are skipped
+                pending &= ~closure
+            if len(self.closure_cache) >= self.closure_cache_size:
+                self.closure_cache.clear()
+            self.closure_cache[bitset] = closure
+            if self.stats is not None:
+                self.stats.count('epsilon_closures')
+        return closure
 
     # Epsilon closure for NFAs
     def epsilon_closure(self, state):
@@ -29,20 +298,64 @@ class FiniteAutomaton(object):
         :param state: current state to validate
         :return: set with all states
         """
-        # Create a new set, with state as its only member
-        states = set()
-        states.add(state)
+        state_index = self.index_states().get(id(state))
+        if state_index is not None:
+            return self.bitset_to_states(self.state_closure(state_index))
+
+        # State outside of the automaton's state list, the closure is walked iteratively
+        states = {state}
+        pending = [state]
+        while pending:
+            current = pending.pop()
+            for identifier, edge in ((current.identifier1, current.edge1), (current.identifier2, current.edge2)):
+                if identifier == 'ε' and edge is not None and edge not in states:
+                    states.add(edge)
+                    pending.append(edge)
+        return states
+
+    def with_stats(self, stats):
+        """
+        View of the automaton that records into other stats, sharing its tables and caches. Engines already
+        built are bound to the view so the closures they compute are counted in the new stats
+        :param stats: AutomatonStats or None
+        :return: automaton view
+        """
+        automaton_view = copy(self)
+        automaton_view.stats = stats
+        if self.simulation is not None:
+            automaton_view.simulation = self.simulation.bind(automaton_view)
+        # A lazy DFA is rebuilt over the bound simulation when the view asks for one
+        automaton_view.lazy_simulation = None
+        return automaton_view
+
+    def bit_parallel(self):
+        """
+        Builds (once) the bit-parallel simulation engine for an NFA
+        :return: bit-parallel NFA
+        """
+        if self.simulation is None:
+            with phase(self.stats, 'nfa_engine'):
+                self.simulation = BitParallelNFA(self)
+        return self.simulation
 
-        # Check if there are epsilon transitions to follow recursively
-        if state.identifier1 == 'ε':
-            if state.edge1 is not None:
-                states |= self.epsilon_closure(state.edge1)
-        if state.identifier2 == 'ε':
-            if state.edge2 is not None:
-                states |= self.epsilon_closure(state.edge2)
+    def lazy_dfa(self, max_states=DEFAULT_MAX_STATES):
+        """
+        Builds (once) a lazy DFA over an NFA: DFA states are created and cached only when an input reaches them
+        :param max_states: state budget of the cache
+        :return: lazy DFA
+        """
+        if self.lazy_simulation is None or self.lazy_simulation.max_states != max(3, max_states):
+            self.lazy_simulation = LazyDFA(self, max_states)
+        return self.lazy_simulation
 
-        # Returns the set of states
-        return states
+    def matching_engine(self):
+        """
+        Gets the engine used for matching: transition table for DFAs, bit-parallel simulation for NFAs
+        :return: matching engine
+        """
+        if self.is_deterministic:
+            return self.compile()
+        return self.bit_parallel()
 
     # Generates a list with all tokens according to an input string
     def match_tokens(self, string):
@@ -51,76 +364,100 @@ class FiniteAutomaton(object):
         :param string: string to validate
         :return: if string is valid + tokens
         """
-        current = set()
-        next_states = set()
-        tokens = []
-        current_iterating_string = ''
-        current_acceptance_string = ''
-
-        # Initial state(s)
-        current |= self.epsilon_closure(self.initial_state)
-
-        while len(string) > 0:
-            for character in string:
-                current_iterating_string += character
-                for c in current:
-                    # If state has a transition with the current character
-                    if c.identifier1 == character:
-                        if self.is_deterministic:
-                            next_states = {c.edge1}
-                        else:
-                            next_states |= self.epsilon_closure(c.edge1)
-                    elif c.identifier2 == character:
-                        if self.is_deterministic:
-                            next_states = {c.edge2}
-                        else:
-                            next_states |= self.epsilon_closure(c.edge2)
-                    elif self.is_deterministic:
-                        break
-                current = next_states
-                next_states = set()
-
-                for state in self.acceptance_states:
-                    if state in current:
-                        current_acceptance_string = current_iterating_string
-                        break
-            # If after iterating through the whole string we get an acceptance string
-            if len(current_acceptance_string) > 0:
-                tokens.append(current_acceptance_string)
-                string = string[len(current_acceptance_string)::]
-                current_iterating_string = ''
-                current_acceptance_string = ''
-                current = self.epsilon_closure(self.initial_state)
-            # No acceptance strings
-            else:
-                tokens.append('EXPRESIÓN INVÁLIDA, Tokens inválidos ->')
-                tokens.append(string)
-                return False, tokens
+        if self.stats is None:
+            return self.matching_engine().match_tokens(string)
+
+        matching_engine = self.matching_engine()
+        with self.stats.phase('matching'):
+            valid, tokens = matching_engine.match_tokens(string)
+        self.stats.count('characters_matched', len(string))
+        # Invalid results end with the error message and the unmatched rest
+        self.stats.count('tokens_matched', len(tokens) if valid else len(tokens) - 2)
+        return valid, tokens
+
+    def iter_token_spans(self, string, start=0):
+        """
+        Lazily splits a string in maximal munch tokens
+        :param string: string to tokenize
+        :param start: position where tokenization begins
+        :return: generator with (start, end) spans over string
+        :raises TokenizationError: when no token matches at a position
+        """
+        return self.matching_engine().iter_token_spans(string, start)
 
-        if len(tokens) > 0:
-            return True, tokens
-        else:
-            for state in self.acceptance_states:
-                if state in current:
-                    return True, tokens
+    def token_spans(self, string):
+        """
+        Splits a string in maximal munch tokens
+        :param string: string to tokenize
+        :return: list with (start, end) spans over string
+        :raises TokenizationError: when no token matches at a position
+        """
+        return self.matching_engine().token_spans(string)
+
+    def search(self, string, start=0):
+        """
+        Finds the leftmost longest non-empty match anywhere in a string, skipping ahead with the literals
+        of the regex when it has any
+        :param string: string to search
+        :param start: position where the search begins
+        :return: (start, end) span of the match, None if there is none
+        """
+        return self.matching_engine().search(string, start, self.prefilter)
+
+    def finditer(self, string, start=0):
+        """
+        Finds every non-overlapping leftmost longest non-empty match in a string, lazily
+        :param string: string to search
+        :param start: position where the search begins
+        :return: generator with (start, end) spans over string
+        """
+        return self.matching_engine().finditer(string, start, self.prefilter)
 
-        tokens.append('EXPRESIÓN INVÁLIDA, Tokens inválidos ->')
-        tokens.append(string)
-        return False, tokens
+    def match_many(self, strings, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Matches many independent strings over a process pool. NFAs are converted to a DFA first, and the
+        compiled DFA is shared with every worker once
+        :param strings: iterable of strings
+        :param workers: number of processes (os.cpu_count() by default)
+        :param chunk_size: strings sent to a worker per task
+        :return: list with the match_tokens result of each string, in input order
+        """
+        dfa = self if self.is_deterministic else AutomatonGeneration().convert_to_dfa(self)
+        return match_many(dfa.compile(), strings, workers, chunk_size)
+
+    def parallel_dfa(self, workers=None, chunk_size=DEFAULT_PARALLEL_CHUNK_SIZE):
+        """
+        Builds a matching engine that splits one large input in chunks scanned by a process pool, with the
+        same results as the sequential engine. NFAs are converted to a DFA first
+        :param workers: number of processes (os.cpu_count() by default, 1 matches in this process)
+        :param chunk_size: characters per chunk
+        :return: parallel DFA
+        """
+        dfa = self if self.is_deterministic else AutomatonGeneration().convert_to_dfa(self)
+        return ParallelDFA(dfa.compile(), workers, chunk_size)
+
+    def export(self, path):
+        """
+        Exports the automaton without opening a window: Graphviz DOT (.dot), GraphML (.graphml) or a
+        layered image (.png, .svg, .pdf). Large automatons should use this instead of display()
+        :param path: file path, the format is chosen by extension
+        """
+        export_automaton(self, path)
 
     def display(self):
         """
         Displays an automaton (graphically)
         """
+        # The plotting stack is slow to import, so only display() loads it
+        import networkx as nx
+        import pylab
+
         graph = nx.DiGraph()
         color_map = []
         acceptance_states = []
         for state in self.states:
-            if state.edge1 is not None:
-                graph.add_edges_from([(state.state_number, state.edge1.state_number)], label=state.identifier1)
-
-            if state.edge2 is not None:
-                graph.add_edges_from([(state.state_number, state.edge2.state_number)], label=state.identifier2)
+            for identifier, edge in state.transitions():
+                graph.add_edges_from([(state.state_number, edge.state_number)], label=str(identifier))
 
             if state.is_acceptance:
                 acceptance_states.append(state.state_number)
@@ -141,372 +478,378 @@ class FiniteAutomaton(object):
         pylab.show()
 
 
+class StateBudgetError(ValueError):
+    """
+    Raised when an automaton would have more states than the budget of its generator
+    """
+
+    def __init__(self, message, max_states):
+        super().__init__(message)
+        self.max_states = max_states
+
+
 class AutomatonGeneration(object):
     """
     Generates automatons
     """
 
+    def __init__(self, stats=None, max_states=DEFAULT_STATE_BUDGET, simplify=True):
+        self.nfa = None
+        # Optional AutomatonStats that records phase timings and counters
+        self.stats = stats
+        # Constructions fail with StateBudgetError instead of growing past this many states
+        self.max_states = max_states
+        # If regexes are simplified before construction (off to build the automaton of the regex as written)
+        self.simplify = simplify
+        # State counts (before, after) of the last minimization
+        self.minimization_report = None
+
     def generate_thompson_nfa(self, regexp):
         """
-        Generates an NFA from a regexp with the Thompson Algorithm
+        Generates an NFA from a regexp with the Thompson Algorithm, stored as compact arrays. The regexp is
+        simplified first (unless simplify is off), so redundant operators do not add states
         Inspired by niemaattarian
         :param regexp: regular expression
         :return: NFA
         """
-        postfix = shunting_yard_algorithm(regexp)
-        nfa_stack = []
-        states = []
-        state_number = 0
-
-        # Looping through the postfix expression
-        for c in postfix:
-            # Kleene base automaton
-            if c == '*':
-                nfa1 = nfa_stack.pop()
-                # New initial and acceptance states
-                initial, accept = State(state_number), State(state_number + 1)
-                state_number += 2
-                states.append(initial)
-                states.append(accept)
-                # We join the automaton
-                initial.edge1, initial.edge2 = nfa1.initial_state, accept
-                initial.identifier1 = 'ε'
-                initial.identifier2 = 'ε'
-                # Join old accept state to the new accept state and NFA's initial state
-                nfa1.acceptance_states.edge1, nfa1.acceptance_states.edge2 = nfa1.initial_state, accept
-                nfa1.acceptance_states.identifier1 = 'ε'
-                nfa1.acceptance_states.identifier2 = 'ε'
-                # NFA foes back into the stack
-                nfa_stack.append(FiniteAutomaton(initial, accept))
-            # Concatenation
-            elif c == '.':
-                nfa2, nfa1 = nfa_stack.pop(), nfa_stack.pop()
-                # Automatons are merged
-                nfa1.acceptance_states.edge1 = nfa2.initial_state
-                nfa1.acceptance_states.identifier1 = 'ε'
-                nfa_stack.append(FiniteAutomaton(nfa1.initial_state, nfa2.acceptance_states))
-            # Or
-            elif c == '|':
-                # Popping the stack
-                nfa2, nfa1 = nfa_stack.pop(), nfa_stack.pop()
-                # Initial state
-                initial = State(state_number)
-                initial.edge1, initial.edge2 = nfa1.initial_state, nfa2.initial_state
-                initial.identifier1 = 'ε'
-                initial.identifier2 = 'ε'
-                # Acceptance state
-                accept = State(state_number + 1)
-                state_number += 2
-                states.append(initial)
-                states.append(accept)
-                # Acceptance state is connected
-                nfa1.acceptance_states.edge1, nfa2.acceptance_states.edge1 = accept, accept
-                nfa1.acceptance_states.identifier1 = 'ε'
-                nfa2.acceptance_states.identifier1 = 'ε'
-                nfa_stack.append(FiniteAutomaton(initial, accept))
-            # Positive closure
-            elif c == '+':
-                nfa1 = nfa_stack.pop()
-                accept, initial = State(state_number), State(state_number + 1)
-                state_number += 2
-                states.append(initial)
-                states.append(accept)
-                # NFAs are joined
-                initial.edge1 = nfa1.initial_state
-                initial.identifier1 = 'ε'
-                nfa1.acceptance_states.edge1, nfa1.acceptance_states.edge2 = nfa1.initial_state, accept
-                nfa1.acceptance_states.identifier1 = 'ε'
-                nfa1.acceptance_states.identifier2 = 'ε'
-                nfa_stack.append(FiniteAutomaton(initial, accept))
-            else:
-                # Base case for a or b literals
-                accept, initial = State(state_number), State(state_number + 1)
-                state_number += 2
-                states.append(initial)
-                states.append(accept)
-                # Character joins the states
-                initial.identifier1, initial.edge1 = c, accept
-                nfa_stack.append(FiniteAutomaton(initial, accept))
-
-        # Once the stack is complete, we pop the finalized NFA and update its states
-        final_nfa = nfa_stack.pop()
-        states[states.index(final_nfa.acceptance_states)].is_acceptance = True
-        states[states.index(final_nfa.initial_state)].is_initial = True
-        states[states.index(final_nfa.initial_state)].state_number = '→' + states[
-            states.index(final_nfa.initial_state)].state_number
-
-        final_nfa.states = states
-        final_nfa.acceptance_states = [states[states.index(final_nfa.acceptance_states)]]
+        with phase(self.stats, 'parse'):
+            regex_tree = self.parse_within_budget(regexp)
+            postfix = regex_tree.postfix()
+        with phase(self.stats, 'thompson_construction'):
+            compact = CompactNFA.from_postfix(postfix)
+
+        final_nfa = FiniteAutomaton.from_compact(compact)
+        final_nfa.stats = self.stats
+        final_nfa.prefilter = LiteralPrefilter.from_tree(regex_tree)
+        if self.stats is not None:
+            self.stats.count('nfa_states', compact.state_count)
 
         self.nfa = final_nfa
         return self.nfa
 
-    @staticmethod
-    def afd_conversion_transition(nfa, checking_state, character):
+    def parse_within_budget(self, regexp):
         """
-        Checks for a move operation
-        :param nfa: NFA
-        :param checking_state: state to check
-        :param character: character to check
-        :return: state set
-        """
-        current_state_construction = set()
-        for state in checking_state:
-            if state.identifier1 == character:
-                current_state_construction.add(state.edge1)
-            if state.identifier2 == character:
-                current_state_construction.add(state.edge2)
-        final_state_construction = current_state_construction.copy()
-        for construction_state in current_state_construction:
-            final_state_construction |= nfa.epsilon_closure(construction_state)
-        return final_state_construction
-
-    def convert_to_dfa(self, nfa):
-        """
-        Converts an NFA to a DFA with the subset method
+        Parses a regexp, checking the size of its expanded repetitions before anything is built
+        :param regexp: regular expression
+        :return: syntax tree
+        :raises StateBudgetError: if its Thompson NFA has more states than the budget
+        """
+        regex_tree = parse_regex(regexp, self.simplify)
+        if regex_tree.state_count > self.max_states:
+            raise StateBudgetError(f'La expresión regular genera {regex_tree.state_count} estados en el AFN, '
+                                   f'más que el límite de {self.max_states} estados', self.max_states)
+        return regex_tree
+
+    def check_state_budget(self, state_count, construction):
+        """
+        Stops a DFA construction that went over the state budget
+        :param state_count: DFA states found so far
+        :param construction: construction name for the error message ('por subconjuntos', 'directa')
+        :raises StateBudgetError: if there are more states than the budget
+        """
+        if state_count > self.max_states:
+            raise StateBudgetError(f'La construcción {construction} superó el límite de {self.max_states} estados '
+                                   f'del AFD', self.max_states)
+
+    def generate_rules_nfa(self, rules):
+        """
+        Joins the Thompson NFAs of several rules with a shared initial state (a tree of ε transitions)
+        :param rules: list of (rule name, regular expression)
+        :return: NFA, list with the acceptance state number of each rule
+        """
+        rule_nfas = [self.generate_thompson_nfa(regexp).compact for _, regexp in rules]
+        # Each rule keeps its states together, so literal transitions still go from state k to k + 1
+        compact, rule_acceptance_states = CompactNFA.join_rules(rule_nfas)
+
+        rules_nfa = FiniteAutomaton.from_compact(compact)
+        rules_nfa.stats = self.stats
+        self.nfa = rules_nfa
+        return rules_nfa, rule_acceptance_states
+
+    def convert_to_dfa(self, nfa, minimize=False):
+        """
+        Converts an NFA to a DFA with the subset method, one transition table column per symbol class
         :param nfa: NFA
+        :param minimize: if the DFA is minimized as a final pass
         :return: DFA
         """
-        unchecked_states = []
-        dfa_states = []
-        transitions = []
+        nfa.bit_parallel()
+        with phase(self.stats, 'subset_construction'):
+            compiled_dfa, _ = self.subset_construction(nfa)
+        if self.stats is not None:
+            self.stats.count('subset_states', compiled_dfa.state_count)
+            self.stats.count('transitions_evaluated', compiled_dfa.state_count * compiled_dfa.symbol_count)
+
+        # Instancing DFA (subset DFA states are labelled by number only)
+        with phase(self.stats, 'linking'):
+            deterministic_finite_automaton = self.link_compiled_dfa(compiled_dfa, initial_arrow=False)
+        deterministic_finite_automaton.stats = self.stats
+        deterministic_finite_automaton.prefilter = nfa.prefilter
+        if minimize:
+            return self.minimize_dfa(deterministic_finite_automaton)
+        return deterministic_finite_automaton
+
+    def subset_construction(self, nfa):
+        """
+        Builds the transition table of the subset DFA of an NFA
+        :param nfa: NFA
+        :return: compiled DFA, list with the NFA state bitset of each DFA state
+        :raises StateBudgetError: if the DFA has more states than the budget
+        """
+        simulation = nfa.bit_parallel()
+        symbol_classes = simulation.symbol_classes
+
+        # Subsets are keyed by NFA state bitsets so lookups are hash based, ids are given in discovery order
+        initial_subset = simulation.initial_closure
+        dfa_states = [initial_subset]
+        dfa_state_ids = {initial_subset: 0}
+        unchecked_states = deque([initial_subset])
+        transitions = array(TRANSITION_TYPECODE)
+        acceptance = bytearray()
 
-        unchecked_states.append(nfa.epsilon_closure(nfa.initial_state))
         # Building the subsets and transition table
         while len(unchecked_states) > 0:
-            checking_state = unchecked_states.pop(0)
-            if checking_state not in dfa_states:
-                current_transitions = [None, None]
-                dfa_states.append(checking_state)
-                a_transition_set = self.afd_conversion_transition(nfa, checking_state, 'a')
-                b_transition_set = self.afd_conversion_transition(nfa, checking_state, 'b')
-                if a_transition_set not in dfa_states and len(a_transition_set) > 0:
-                    if a_transition_set not in unchecked_states:
-                        unchecked_states.append(a_transition_set)
-                    current_transitions[0] = len(dfa_states) + unchecked_states.index(a_transition_set)
-                elif len(a_transition_set) > 0:
-                    current_transitions[0] = dfa_states.index(a_transition_set)
-
-                if b_transition_set not in dfa_states and len(b_transition_set) > 0:
-                    if b_transition_set not in unchecked_states:
-                        unchecked_states.append(b_transition_set)
-                    current_transitions[1] = len(dfa_states) + unchecked_states.index(b_transition_set)
-                elif len(b_transition_set) > 0:
-                    current_transitions[1] = dfa_states.index(b_transition_set)
-
-                transitions.append(current_transitions)
+            checking_state = unchecked_states.popleft()
+            acceptance.append(1 if checking_state & simulation.acceptance_bitset else 0)
+            for code in range(symbol_classes.class_count):
+                transition_set = simulation.step_class(checking_state, code)
+                if transition_set == 0:
+                    transitions.append(DEAD_STATE)
+                    continue
+                transition_id = dfa_state_ids.get(transition_set)
+                if transition_id is None:
+                    transition_id = len(dfa_states)
+                    self.check_state_budget(transition_id + 1, 'por subconjuntos')
+                    dfa_state_ids[transition_set] = transition_id
+                    dfa_states.append(transition_set)
+                    unchecked_states.append(transition_set)
+                transitions.append(transition_id)
+
+        return CompiledDFA(symbol_classes, transitions, acceptance, 0), dfa_states
 
+    @staticmethod
+    def link_compiled_dfa(compiled_dfa, initial_arrow=True):
+        """
+        Builds the linked State graph of a compiled DFA
+        :param compiled_dfa: compiled DFA
+        :param initial_arrow: if the label of the initial state starts with '→'
+        :return: DFA
+        """
         deterministic_finite_automaton = FiniteAutomaton(None, [], True)
+        dfa_linked_states = [State(dfa_state_number) for dfa_state_number in range(compiled_dfa.state_count)]
+        width = compiled_dfa.symbol_count
 
-        dfa_linked_states = [State(None) for i in range(len(transitions))]
-
-        # Linking all states
-        for dfa_state_number in range(len(transitions)):
-
-            current_state = dfa_linked_states[dfa_state_number]
-            a_transition, b_transition = transitions[dfa_state_number]
-            current_state.state_number = dfa_state_number
-
-            if a_transition is not None:
-                current_state.identifier1 = 'a'
-                current_state.edge1 = dfa_linked_states[a_transition]
-            if b_transition is not None:
-                current_state.identifier2 = 'b'
-                current_state.edge2 = dfa_linked_states[b_transition]
+        # States are linked (one edge per symbol class)
+        for dfa_state_number, current_state in enumerate(dfa_linked_states):
+            for code, label in enumerate(compiled_dfa.symbol_classes.labels):
+                target = compiled_dfa.transitions[dfa_state_number * width + code]
+                if target != DEAD_STATE:
+                    current_state.add_transition(label, dfa_linked_states[target])
 
-            for state in dfa_states[dfa_state_number]:
-                if state in nfa.acceptance_states:
-                    current_state.is_acceptance = True
-                    deterministic_finite_automaton.acceptance_states.append(current_state)
+            if compiled_dfa.acceptance[dfa_state_number]:
+                current_state.is_acceptance = True
+                deterministic_finite_automaton.acceptance_states.append(current_state)
 
-            if dfa_state_number == 0:
+            if dfa_state_number == compiled_dfa.initial_state:
                 current_state.is_initial = True
+                if initial_arrow:
+                    current_state.state_number = '→' + current_state.state_number
                 deterministic_finite_automaton.initial_state = current_state
 
-        # Instancing DFA
         deterministic_finite_automaton.states = dfa_linked_states
-        deterministic_finite_automaton.is_deterministic = True
+        deterministic_finite_automaton.alphabet = compiled_dfa.symbol_classes
+        deterministic_finite_automaton.compiled = compiled_dfa
         return deterministic_finite_automaton
 
+    def minimize_dfa(self, dfa):
+        """
+        Minimizes a deterministic automaton (Hopcroft). The state counts are kept in minimization_report
+        :param dfa: DFA
+        :return: minimal DFA, labelled like dfa
+        """
+        compiled_dfa = dfa.compile()
+        with phase(self.stats, 'minimization'):
+            minimal_dfa = compiled_dfa.minimized()
+        self.minimization_report = (compiled_dfa.state_count, minimal_dfa.state_count)
+        initial_arrow = str(dfa.initial_state.state_number).startswith('→')
+        with phase(self.stats, 'linking'):
+            minimal_linked_dfa = self.link_compiled_dfa(minimal_dfa, initial_arrow)
+        minimal_linked_dfa.stats = self.stats
+        minimal_linked_dfa.prefilter = dfa.prefilter
+        return minimal_linked_dfa
+
     @staticmethod
-    def get_node(index, node_list):
+    def repeat_positions(next_positions, first_positions, last_positions):
         """
-        Gets a node with an index
-        :param index: index
-        :param node_list: list of all nodes
-        :return:
+        Next position calculation of a closure: the last positions are followed by the first ones
+        :param next_positions: next positions bitset of each position
+        :param first_positions: first positions bitset of the node
+        :param last_positions: last positions bitset of the node
         """
-        for node in node_list:
-            if node.index == index:
-                return node
+        for position in bitset_indexes(last_positions):
+            next_positions[position] |= first_positions
 
     @staticmethod
-    def get_transition_nodes(character, node_dictionary, current_node):
+    def concatenate_positions(next_positions, node1, node2):
+        """
+        Concatenates two syntax tree nodes of the direct construction
+        :param next_positions: next positions bitset of each position
+        :param node1: (nullable, first positions, last positions, ...) of the left node
+        :param node2: (nullable, first positions, last positions, ...) of the right node
+        :return: (nullable, first positions, last positions) of the concatenation
         """
-        Gets all the transition nodes for direct construction table
-        :param character: character to check
-        :param node_dictionary: node dictionary table
-        :param current_node: current node
-        :return: node list with transition nodes
+        nullable1, first_positions1, last_positions1 = node1[:3]
+        nullable2, first_positions2, last_positions2 = node2[:3]
+        # Next position calculation
+        for position in bitset_indexes(last_positions1):
+            next_positions[position] |= first_positions2
+        return (nullable1 and nullable2, first_positions1 | first_positions2 if nullable1 else first_positions1,
+                last_positions1 | last_positions2 if nullable2 else last_positions2)
+
+    def repetition_positions(self, position_characters, next_positions, node, repetition):
         """
-        character_node_list = []
+        Builds r{m,n} in the direct construction. The positions of r are copied as a block, with their next
+        positions shifted (a finished node only has next positions inside itself), and the copies are joined
+        as r.r...r* or r.r...(r.(r)?)? like the Thompson construction
+        :param position_characters: character of each position
+        :param next_positions: next positions bitset of each position
+        :param node: (nullable, first positions, last positions, first position) of r
+        :param repetition: Repetition
+        :return: (nullable, first positions, last positions) of the repetition
+        """
+        minimum, maximum = repetition.minimum, repetition.maximum
+        copies = max(minimum, 1) if maximum is None else maximum
+        nullable, first_positions, last_positions, first_position = node
+        end = len(position_characters)
+        nodes = [node]
+        for _ in range(copies - 1):
+            offset = len(position_characters) - first_position
+            position_characters.extend(position_characters[first_position:end])
+            next_positions.extend(positions << offset for positions in next_positions[first_position:end])
+            nodes.append((nullable, first_positions << offset, last_positions << offset))
+
+        if maximum is None:
+            nullable, first_positions, last_positions = nodes[-1][:3]
+            self.repeat_positions(next_positions, first_positions, last_positions)
+            nodes[-1] = (nullable or minimum == 0, first_positions, last_positions)
+            required, optional = nodes, []
+        else:
+            required, optional = nodes[:minimum], nodes[minimum:]
 
-        for node in current_node:
-            if node_dictionary[node][0] == character:
-                for index in node_dictionary[node][1]:
-                    character_node_list.append(index)
+        if optional:
+            # Nested optional copies, from the innermost one
+            tail = (True,) + optional[-1][1:3]
+            for optional_node in reversed(optional[:-1]):
+                tail = (True,) + self.concatenate_positions(next_positions, optional_node, tail)[1:]
+            required.append(tail)
 
-        return list(set(character_node_list))
+        repeated = required[0][:3]
+        for required_node in required[1:]:
+            repeated = self.concatenate_positions(next_positions, repeated, required_node)
+        return repeated
 
-    def direct_dfa_construction(self, regexp):
+    def direct_dfa_construction(self, regexp, minimize=False):
         """
-        Constructs a DFA from a regular expression
+        Constructs a DFA from a regular expression (followpos method). Positions are numbered in the
+        postfix order of the simplified syntax tree (repetitions are copied blocks of positions), and
+        nullable / firstpos / lastpos / followpos are integer bitsets over positions
         :param regexp: regular expression
+        :param minimize: if the DFA is minimized as a final pass
         :return: DFA
         """
-        syntactic_tree_node_list = []
-        postfix_expression = shunting_yard_algorithm(regexp)
+        with phase(self.stats, 'parse'):
+            regex_tree = self.parse_within_budget(regexp)
+            postfix_expression = regex_tree.postfix()
+        # Augmented expression, the '#' position marks acceptance
         postfix_expression.append('#')
         postfix_expression.append('.')
-        operators = {'*': 4, '+': 3, '.': 2, '|': 1}
-        nullable_characters = ['ε', '*']
-        all_nodes = []
-        current_character_index = 0
-
-        # We build the tree and calculate first position, last position, and next position
-        for character in postfix_expression:
-            new_node = DirectConstructionNode(character=character)
-
-            if character in nullable_characters:
-                new_node.nullable = True
-
-            if character not in operators:
-                new_node.index = current_character_index
-                if character != 'ε':
-                    new_node.first_position = {current_character_index}
-                    new_node.last_position = {current_character_index}
-                else:
-                    new_node.first_position = set([])
-                    new_node.last_position = set([])
-                current_character_index += 1
-
-            elif character == '*' or character == '+':
-                new_node.edge1 = syntactic_tree_node_list.pop()
-                new_node.first_position = new_node.edge1.first_position.copy()
-                new_node.last_position = new_node.edge1.last_position.copy()
-
-                # Next position calculation
-                for node in new_node.edge1.last_position:
-                    node = self.get_node(node, all_nodes)
-                    node.next_position |= new_node.edge1.first_position
-            else:
-                new_node.edge2 = syntactic_tree_node_list.pop()
-                new_node.edge1 = syntactic_tree_node_list.pop()
-                if character == '|':
-                    new_node.nullable = new_node.edge1.nullable or new_node.edge2.nullable
-                    new_node.first_position = new_node.edge1.first_position | new_node.edge2.first_position
-                    new_node.last_position = new_node.edge1.last_position | new_node.edge2.last_position
-                    new_node.next_position = new_node.first_position.copy()
+
+        with phase(self.stats, 'direct_construction'):
+            # Character of each position and its next positions
+            position_characters = []
+            next_positions = []
+            # Syntax tree nodes only live on the stack as (nullable, first positions, last positions, first
+            # position), the positions of a node are the consecutive ones from its first position
+            node_stack = []
+
+            for character in postfix_expression:
+                if character == '*' or character == '+':
+                    nullable, first_positions, last_positions, first_position = node_stack.pop()
+                    self.repeat_positions(next_positions, first_positions, last_positions)
+                    node_stack.append((nullable or character == '*', first_positions, last_positions, first_position))
                 elif character == '.':
-                    new_node.nullable = new_node.edge1.nullable and new_node.edge2.nullable
-                    if new_node.nullable:
-                        new_node.first_position = new_node.edge1.first_position | new_node.edge2.first_position
-                        new_node.last_position = new_node.edge1.last_position | new_node.edge2.last_position
+                    node2, node1 = node_stack.pop(), node_stack.pop()
+                    node_stack.append(self.concatenate_positions(next_positions, node1, node2) + (node1[3],))
+                elif character == '|':
+                    (nullable2, first_positions2, last_positions2, _), \
+                        (nullable1, first_positions1, last_positions1, first_position) = \
+                        node_stack.pop(), node_stack.pop()
+                    node_stack.append((nullable1 or nullable2, first_positions1 | first_positions2,
+                                       last_positions1 | last_positions2, first_position))
+                elif isinstance(character, Repetition):
+                    node = node_stack.pop()
+                    repetition = self.repetition_positions(position_characters, next_positions, node, character)
+                    node_stack.append(repetition + (node[3],))
+                else:
+                    position = len(position_characters)
+                    position_characters.append(character)
+                    next_positions.append(0)
+                    if character == EPSILON:
+                        node_stack.append((True, 0, 0, position))
                     else:
-                        new_node.first_position = new_node.edge1.first_position.copy()
-                        new_node.last_position = new_node.edge2.last_position.copy()
-
-                    # Next position calculation
-                    for node in new_node.edge1.last_position:
-                        node = self.get_node(node, all_nodes)
-                        node.next_position |= new_node.edge2.first_position
-            syntactic_tree_node_list.append(new_node)
-            all_nodes.append(new_node)
-
-        state_table = []
-
-        # Build table with states
-        for i in range(current_character_index):
-            state_table.append(self.get_node(i, all_nodes))
-
-        acceptance_index = len(state_table) - 1
-        initial_index = 0
-        unchecked_states = []
-        dfa_states = []
-        transitions = []
-        state_dictionary = {}
-
-        # We build the position list with next position function result
-        for i in range(len(state_table)):
-            current_state = state_table[i]
-            position_list = []
-            for index in current_state.next_position:
-                position_list.append(index)
-
-            state_dictionary[i] = [state_table[i].character, position_list]
-
-        # Initial state
-        for i in range(len(state_dictionary)):
-            if 0 not in state_dictionary[i][1]:
-                continue
-            else:
-                initial_index = i
-                unchecked_states.append(state_dictionary[0][1])
-                break
-
-        if len(unchecked_states) <= 0:
-            unchecked_states.append([0])
-
-        # We build the DFA states from the next position dictionary
-        while len(unchecked_states) > 0:
-            current_node = unchecked_states.pop(0)
-            if current_node not in dfa_states:
-                current_transition = [None, None]
-                dfa_states.append(current_node)
-                a_transition = self.get_transition_nodes('a', state_dictionary, current_node)
-                b_transition = self.get_transition_nodes('b', state_dictionary, current_node)
-                if a_transition not in dfa_states and len(a_transition) > 0:
-                    if a_transition not in unchecked_states:
-                        unchecked_states.append(a_transition)
-                    current_transition[0] = len(dfa_states) + unchecked_states.index(a_transition)
-                elif len(a_transition) > 0:
-                    current_transition[0] = dfa_states.index(a_transition)
-
-                if b_transition not in dfa_states and len(b_transition) > 0:
-                    if b_transition not in unchecked_states:
-                        unchecked_states.append(b_transition)
-                    current_transition[1] = len(dfa_states) + unchecked_states.index(b_transition)
-                elif len(b_transition) > 0:
-                    current_transition[1] = dfa_states.index(b_transition)
-                transitions.append(current_transition)
-
-        deterministic_finite_automaton = FiniteAutomaton(None, [], True)
-
-        dfa_linked_states = [State(None) for i in range(len(transitions))]
-
-        # States are linked
-        for dfa_state_number in range(len(transitions)):
-            current_state = dfa_linked_states[dfa_state_number]
-            a_transition, b_transition = transitions[dfa_state_number]
-            current_state.state_number = dfa_state_number
-
-            if a_transition is not None:
-                current_state.identifier1 = 'a'
-                current_state.edge1 = dfa_linked_states[a_transition]
-            if b_transition is not None:
-                current_state.identifier2 = 'b'
-                current_state.edge2 = dfa_linked_states[b_transition]
-
-            for state in dfa_states[dfa_state_number]:
-                if state == acceptance_index:
-                    current_state.is_acceptance = True
-                    deterministic_finite_automaton.acceptance_states.append(current_state)
-
-            if dfa_state_number == initial_index:
-                current_state.is_initial = True
-                current_state.state_number = '→' + str(current_state.state_number)
-                deterministic_finite_automaton.initial_state = current_state
+                        node_stack.append((False, 1 << position, 1 << position, position))
+
+            _, initial_positions, _, _ = node_stack.pop()
+            acceptance_position = len(position_characters) - 1
+
+            # Symbol classes of the leaves ('#' and ε are not matched by any class)
+            symbol_classes = SymbolClasses.from_character_classes(
+                character for character in position_characters if isinstance(character, CharacterClass))
+            width = symbol_classes.class_count
+            class_positions = [[] for _ in range(width)]
+            for position, character in enumerate(position_characters):
+                if isinstance(character, CharacterClass):
+                    for code in symbol_classes.codes_in(character):
+                        class_positions[code].append(position)
+            class_masks = [indexes_to_bitset(positions, len(position_characters)) for positions in class_positions]
+
+            # We build the DFA states (position bitsets) keyed by hash, ids are given in discovery order
+            dfa_states = [initial_positions]
+            dfa_state_ids = {initial_positions: 0}
+            unchecked_states = deque([initial_positions])
+            table = array(TRANSITION_TYPECODE)
+            acceptance = bytearray()
+            while len(unchecked_states) > 0:
+                current_positions = unchecked_states.popleft()
+                acceptance.append(1 if current_positions >> acceptance_position & 1 else 0)
+                for code in range(width):
+                    transition_positions = 0
+                    for position in bitset_indexes(current_positions & class_masks[code]):
+                        transition_positions |= next_positions[position]
+                    if transition_positions == 0:
+                        table.append(DEAD_STATE)
+                        continue
+                    transition_id = dfa_state_ids.get(transition_positions)
+                    if transition_id is None:
+                        transition_id = len(dfa_states)
+                        self.check_state_budget(transition_id + 1, 'directa')
+                        dfa_state_ids[transition_positions] = transition_id
+                        dfa_states.append(transition_positions)
+                        unchecked_states.append(transition_positions)
+                    table.append(transition_id)
+
+        if self.stats is not None:
+            self.stats.count('direct_states', len(dfa_states))
+            self.stats.count('transitions_evaluated', len(dfa_states) * width)
+
+        # States are linked from the transition table
+        with phase(self.stats, 'linking'):
+            deterministic_finite_automaton = self.link_compiled_dfa(
+                CompiledDFA(symbol_classes, table, acceptance, 0))
+        deterministic_finite_automaton.stats = self.stats
+        deterministic_finite_automaton.prefilter = LiteralPrefilter.from_tree(regex_tree)
 
         # DFA is returned
-        deterministic_finite_automaton.states = dfa_linked_states
+        if minimize:
+            return self.minimize_dfa(deterministic_finite_automaton)
         return deterministic_finite_automaton
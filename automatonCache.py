@@ -0,0 +1,144 @@
+"""
+automatonCache.py
+Size bounded LRU cache of compiled automatons
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from automaton import AutomatonGeneration
+from regexParser import parse_regex
+
+# Construction methods
+THOMPSON_NFA = 'thompson'
+SUBSET_DFA = 'subset'
+DIRECT_DFA = 'direct'
+CONSTRUCTION_METHODS = (THOMPSON_NFA, SUBSET_DFA, DIRECT_DFA)
+DEFAULT_CACHE_SIZE = 256
+
+
+def normalize_regex(regex):
+    """
+    Normalizes a regex so equivalent spellings share a cache entry (redundant parenthesis, escapes, classes
+    and everything the simplification pass rewrites, like a|a or (a*)*)
+    :param regex: regular expression
+    :return: hashable normalized regex
+    """
+    return tuple(parse_regex(regex).postfix())
+
+
+def with_stats(automaton, stats):
+    """
+    Gives a cached automaton the stats of a lookup without touching the shared entry
+    :param automaton: cached automaton
+    :param stats: optional AutomatonStats
+    :return: the automaton itself without stats, otherwise a view bound to them (FiniteAutomaton.with_stats)
+    """
+    if stats is None:
+        return automaton
+    return automaton.with_stats(stats)
+
+
+class AutomatonCache(object):
+    """
+    LRU cache of automatons keyed by normalized regex and construction method, safe to share across threads
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, regex, method=SUBSET_DFA, minimize=False, stats=None):
+        """
+        Gets the automaton for a regex, building it on a miss
+        :param regex: regular expression
+        :param method: construction method (THOMPSON_NFA, SUBSET_DFA or DIRECT_DFA)
+        :param minimize: if DFAs are minimized
+        :param stats: optional AutomatonStats of this lookup (build and matches of the returned automaton)
+        :return: automaton (shared, it must not be modified)
+        """
+        if method not in CONSTRUCTION_METHODS:
+            raise ValueError(f'Unknown construction method {method}, use one of {CONSTRUCTION_METHODS}')
+        key = (normalize_regex(regex), method, minimize and method != THOMPSON_NFA)
+
+        with self.lock:
+            automaton = self.entries.get(key)
+            if automaton is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                if stats is not None:
+                    stats.count('cache_hits')
+                return with_stats(automaton, stats)
+            self.misses += 1
+
+        # Built outside the lock so other patterns are not blocked, the first stored build wins
+        automaton = self.build(regex, method, minimize, stats)
+        # The stored automaton records nothing, each lookup gets a view with its own stats
+        automaton.stats = None
+
+        with self.lock:
+            stored_automaton = self.entries.get(key)
+            if stored_automaton is not None:
+                self.entries.move_to_end(key)
+                return with_stats(stored_automaton, stats)
+            self.entries[key] = automaton
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return with_stats(automaton, stats)
+
+    def build(self, regex, method, minimize, stats=None):
+        """
+        Builds an automaton and its matching engine
+        :param regex: regular expression
+        :param method: construction method
+        :param minimize: if DFAs are minimized
+        :param stats: optional AutomatonStats
+        :return: automaton
+        """
+        automaton_generator = AutomatonGeneration(stats)
+        if method == THOMPSON_NFA:
+            automaton = automaton_generator.generate_thompson_nfa(regex)
+        elif method == SUBSET_DFA:
+            automaton = automaton_generator.convert_to_dfa(self.get(regex, THOMPSON_NFA, stats=stats), minimize)
+        else:
+            automaton = automaton_generator.direct_dfa_construction(regex, minimize)
+
+        # Engines are built before sharing so readers never race on their lazy construction
+        automaton.matching_engine()
+        return automaton
+
+    def clear(self):
+        """
+        Removes every entry (counters are kept)
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def statistics(self):
+        """
+        Cache counters
+        :return: dictionary with size, hits, misses and evictions
+        """
+        with self.lock:
+            return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+
+shared_cache = AutomatonCache()
+
+
+def compile_regex(regex, method=SUBSET_DFA, minimize=False, stats=None):
+    """
+    Gets an automaton for a regex from the shared cache
+    :param regex: regular expression
+    :param method: construction method (THOMPSON_NFA, SUBSET_DFA or DIRECT_DFA)
+    :param minimize: if DFAs are minimized
+    :param stats: optional AutomatonStats of this lookup
+    :return: automaton
+    """
+    return shared_cache.get(regex, method, minimize, stats)
@@ -0,0 +1,281 @@
+"""
+automatonExport.py
+Streaming Graphviz DOT / GraphML exporters and a layered render-to-file mode for large automatons
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from collections import deque
+from alphabet import EPSILON
+from compactNfa import EPSILON_SYMBOL, NO_EDGE, ACCEPTANCE_FLAG, INITIAL_FLAG, SWAPPED_NUMBER_FLAG
+from compiledAutomaton import CompiledDFA, DEAD_STATE
+
+# Above these sizes the rendered image skips node and edge labels (text drawing dominates the time)
+MAX_LABELED_NODES = 300
+MAX_LABELED_EDGES = 600
+# Bigger drawings are scaled down to keep the image (and the rasterization time) bounded
+MAX_FIGURE_INCHES = 40
+
+
+class AutomatonGraph(object):
+    """
+    Read only graph view of an automaton: compact NFAs and compiled DFAs are read straight from their
+    arrays, other automatons from their State graph
+    """
+
+    def __init__(self, node_count, node_name, node_flags, edges_from):
+        self.node_count = node_count
+        # node number -> displayed name, node number -> (is initial, is acceptance), node number -> edges
+        self.node_name = node_name
+        self.node_flags = node_flags
+        self.edges_from = edges_from
+
+    @classmethod
+    def of(cls, automaton):
+        """
+        Gets the graph view of an automaton
+        :param automaton: FiniteAutomaton or CompiledDFA
+        :return: automaton graph
+        """
+        if isinstance(automaton, CompiledDFA):
+            return cls.of_compiled_dfa(automaton)
+        if automaton.compact is not None and automaton.linked_states is None:
+            return cls.of_compact_nfa(automaton.compact)
+        return cls.of_states(automaton.states)
+
+    @classmethod
+    def of_compact_nfa(cls, compact):
+        """
+        Graph view of a compact NFA (same state numbers as its linked State graph)
+        :param compact: compact NFA
+        :return: automaton graph
+        """
+        def node_name(node):
+            flags = compact.flags[node]
+            name = str(node ^ 1 if flags & SWAPPED_NUMBER_FLAG else node)
+            return '→' + name if flags & INITIAL_FLAG else name
+
+        def node_flags(node):
+            flags = compact.flags[node]
+            return bool(flags & INITIAL_FLAG), bool(flags & ACCEPTANCE_FLAG)
+
+        def edges_from(node):
+            symbol = compact.symbols[node]
+            if symbol != EPSILON_SYMBOL:
+                return [(compact.edge1[node], str(compact.character_classes[symbol]))]
+            return [(edge, EPSILON) for edge in (compact.edge1[node], compact.edge2[node]) if edge != NO_EDGE]
+
+        return cls(compact.state_count, node_name, node_flags, edges_from)
+
+    @classmethod
+    def of_compiled_dfa(cls, compiled_dfa):
+        """
+        Graph view of a compiled DFA, edges to the same target are merged into one edge
+        :param compiled_dfa: compiled DFA
+        :return: automaton graph
+        """
+        labels = compiled_dfa.symbol_classes.labels
+        width = compiled_dfa.symbol_count
+
+        def node_name(node):
+            return '→' + str(node) if node == compiled_dfa.initial_state else str(node)
+
+        def node_flags(node):
+            return node == compiled_dfa.initial_state, bool(compiled_dfa.acceptance[node])
+
+        def edges_from(node):
+            target_labels = {}
+            for code in range(width):
+                target = compiled_dfa.transitions[node * width + code]
+                if target != DEAD_STATE:
+                    target_labels.setdefault(target, []).append(labels[code])
+            return [(target, ','.join(target_labels[target])) for target in target_labels]
+
+        return cls(compiled_dfa.state_count, node_name, node_flags, edges_from)
+
+    @classmethod
+    def of_states(cls, states):
+        """
+        Graph view of a linked State graph
+        :param states: list of states
+        :return: automaton graph
+        """
+        state_indexes = {id(state): index for index, state in enumerate(states)}
+
+        def node_name(node):
+            return states[node].state_number
+
+        def node_flags(node):
+            return states[node].is_initial, states[node].is_acceptance
+
+        def edges_from(node):
+            target_labels = {}
+            for identifier, edge in states[node].transitions():
+                target_labels.setdefault(state_indexes[id(edge)], []).append(str(identifier))
+            return [(target, ','.join(target_labels[target])) for target in target_labels]
+
+        return cls(len(states), node_name, node_flags, edges_from)
+
+
+def dot_string(text):
+    """
+    Quotes a DOT identifier or label
+    :param text: text
+    :return: quoted text
+    """
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def write_dot(automaton, output):
+    """
+    Writes an automaton in Graphviz DOT format, state by state (no intermediate graph is built)
+    :param automaton: FiniteAutomaton or CompiledDFA
+    :param output: text file object
+    """
+    graph = AutomatonGraph.of(automaton)
+    output.write('digraph automaton {\n  rankdir=LR;\n  node [shape=circle];\n')
+    for node in range(graph.node_count):
+        is_initial, is_acceptance = graph.node_flags(node)
+        attributes = ['label=' + dot_string(graph.node_name(node))]
+        if is_acceptance:
+            attributes.append('shape=doublecircle')
+        if is_initial:
+            attributes.append('style=bold')
+        output.write(f'  {node} [{", ".join(attributes)}];\n')
+        for target, label in graph.edges_from(node):
+            output.write(f'  {node} -> {target} [label={dot_string(label)}];\n')
+    output.write('}\n')
+
+
+def write_graphml(automaton, output):
+    """
+    Writes an automaton in GraphML format, state by state (no intermediate graph is built)
+    :param automaton: FiniteAutomaton or CompiledDFA
+    :param output: text file object
+    """
+    # saxutils pulls in urllib and email, so it is only loaded here to keep the CLI start up fast
+    from xml.sax.saxutils import escape
+
+    graph = AutomatonGraph.of(automaton)
+    output.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                 '  <key id="name" for="node" attr.name="name" attr.type="string"/>\n'
+                 '  <key id="initial" for="node" attr.name="initial" attr.type="boolean"/>\n'
+                 '  <key id="acceptance" for="node" attr.name="acceptance" attr.type="boolean"/>\n'
+                 '  <key id="label" for="edge" attr.name="label" attr.type="string"/>\n'
+                 '  <graph id="automaton" edgedefault="directed">\n')
+    for node in range(graph.node_count):
+        is_initial, is_acceptance = graph.node_flags(node)
+        output.write(f'    <node id="n{node}"><data key="name">{escape(graph.node_name(node))}</data>'
+                     f'<data key="initial">{str(is_initial).lower()}</data>'
+                     f'<data key="acceptance">{str(is_acceptance).lower()}</data></node>\n')
+        for target, label in graph.edges_from(node):
+            output.write(f'    <edge source="n{node}" target="n{target}">'
+                         f'<data key="label">{escape(label)}</data></edge>\n')
+    output.write('  </graph>\n</graphml>\n')
+
+
+def export_automaton(automaton, path):
+    """
+    Exports an automaton to a file, the format is chosen by extension: .dot / .gv, .graphml, or an
+    image format supported by matplotlib (.png, .svg, .pdf) for render_to_file
+    :param automaton: FiniteAutomaton or CompiledDFA
+    :param path: file path
+    """
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    if extension in ('dot', 'gv'):
+        with open(path, 'w', encoding='utf-8') as output:
+            write_dot(automaton, output)
+    elif extension == 'graphml':
+        with open(path, 'w', encoding='utf-8') as output:
+            write_graphml(automaton, output)
+    else:
+        render_to_file(automaton, path)
+
+
+def layered_layout(graph):
+    """
+    Layered (BFS) layout: the x coordinate is the BFS depth from the initial state, nodes of a layer are
+    spread vertically in discovery order. Unreachable nodes go to an extra last layer. Linear time
+    :param graph: automaton graph
+    :return: (x coordinates, y coordinates, edge list)
+    """
+    depth = [-1] * graph.node_count
+    layer_sizes = []
+    row = [0] * graph.node_count
+    edges = []
+    pending = deque(node for node in range(graph.node_count) if graph.node_flags(node)[0])
+    for node in pending:
+        depth[node] = 0
+    if pending:
+        layer_sizes.append(len(pending))
+        for index, node in enumerate(pending):
+            row[node] = index
+
+    while pending:
+        node = pending.popleft()
+        for target, label in graph.edges_from(node):
+            edges.append((node, target, label))
+            if depth[target] == -1:
+                depth[target] = depth[node] + 1
+                if depth[target] == len(layer_sizes):
+                    layer_sizes.append(0)
+                row[target] = layer_sizes[depth[target]]
+                layer_sizes[depth[target]] += 1
+                pending.append(target)
+
+    unreachable_layer = len(layer_sizes)
+    for node in range(graph.node_count):
+        if depth[node] == -1:
+            depth[node] = unreachable_layer
+            if unreachable_layer == len(layer_sizes):
+                layer_sizes.append(0)
+            row[node] = layer_sizes[unreachable_layer]
+            layer_sizes[unreachable_layer] += 1
+            edges.extend((node, target, label) for target, label in graph.edges_from(node))
+
+    # Layers are centered vertically
+    y_coordinates = [row[node] - (layer_sizes[depth[node]] - 1) / 2 for node in range(graph.node_count)]
+    return depth, y_coordinates, edges
+
+
+def render_to_file(automaton, path, dpi=100):
+    """
+    Renders an automaton to an image file without opening a window (matplotlib's Agg canvas, no pyplot).
+    Uses the layered layout and draws every edge in one collection, so 10k+ states render in seconds
+    :param automaton: FiniteAutomaton or CompiledDFA
+    :param path: image path (.png, .svg, .pdf...)
+    :param dpi: image resolution
+    """
+    # Plotting is optional and slow to import, so it is only loaded here
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+
+    graph = AutomatonGraph.of(automaton)
+    x_coordinates, y_coordinates, edges = layered_layout(graph)
+    layer_count = max(x_coordinates, default=0) + 1
+    layer_height = max((abs(y) for y in y_coordinates), default=0) * 2 + 1
+
+    figure = Figure(figsize=(min(4 + layer_count * 1.2, MAX_FIGURE_INCHES),
+                             min(3 + layer_height * 0.4, MAX_FIGURE_INCHES)))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+    axes.set_axis_off()
+
+    segments = [((x_coordinates[source], y_coordinates[source]), (x_coordinates[target], y_coordinates[target]))
+                for source, target, _ in edges]
+    axes.add_collection(LineCollection(segments, colors='gray', linewidths=0.5, alpha=0.6))
+    colors = ['green' if graph.node_flags(node)[1] else 'gray' for node in range(graph.node_count)]
+    axes.scatter(x_coordinates, y_coordinates, c=colors, s=200 if graph.node_count <= MAX_LABELED_NODES else 4,
+                 zorder=2)
+
+    if graph.node_count <= MAX_LABELED_NODES:
+        for node in range(graph.node_count):
+            axes.annotate(graph.node_name(node), (x_coordinates[node], y_coordinates[node]), ha='center',
+                          va='center', fontsize=8, zorder=3)
+    if len(edges) <= MAX_LABELED_EDGES:
+        for source, target, label in edges:
+            axes.annotate(label, ((x_coordinates[source] + x_coordinates[target]) / 2,
+                                  (y_coordinates[source] + y_coordinates[target]) / 2), fontsize=7, color='blue')
+    axes.autoscale_view()
+    figure.savefig(path, dpi=dpi)
@@ -0,0 +1,148 @@
+"""
+automatonStats.py
+Opt-in statistics (phase timings, counters and histograms) for automaton construction and matching
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+# Shared no-op context used when statistics are disabled
+DISABLED_PHASE = nullcontext()
+DEFAULT_BUCKET_COUNT = 24
+
+
+class AutomatonStats(object):
+    """
+    Collects accumulated time per phase and event counters. Builders and automatons only record into it
+    when one is given, otherwise they skip the bookkeeping
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.phase_calls = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times a phase, repeated phases accumulate
+        :param name: phase name
+        """
+        start = perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + perf_counter() - start
+            self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+
+    def count(self, name, amount=1):
+        """
+        Increments a counter
+        :param name: counter name
+        :param amount: increment
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        """
+        Clears every timing and counter
+        """
+        self.timings.clear()
+        self.phase_calls.clear()
+        self.counters.clear()
+
+    def as_dict(self):
+        """
+        Structured copy of the statistics
+        :return: dictionary with phases (seconds and calls) and counters
+        """
+        return {'phases': {name: {'seconds': seconds, 'calls': self.phase_calls[name]}
+                           for name, seconds in self.timings.items()},
+                'counters': dict(self.counters)}
+
+    def report(self):
+        """
+        Human readable statistics
+        :return: text with one line per phase and counter
+        """
+        lines = []
+        for name, seconds in self.timings.items():
+            lines.append(f'{name:<24}{seconds * 1000:>12.3f} ms  ({self.phase_calls[name]} calls)')
+        for name, value in self.counters.items():
+            lines.append(f'{name:<24}{value:>12}')
+        return '\n'.join(lines)
+
+
+def phase(stats, name):
+    """
+    Times a phase if statistics are enabled
+    :param stats: AutomatonStats or None
+    :param name: phase name
+    :return: context manager
+    """
+    if stats is None:
+        return DISABLED_PHASE
+    return stats.phase(name)
+
+
+class ExponentialHistogram(object):
+    """
+    Histogram with exponential buckets (each bucket ends at twice the end of the previous one), so a few
+    buckets cover latencies from microseconds to seconds. Percentiles are the end of their bucket
+    """
+
+    def __init__(self, smallest, bucket_count=DEFAULT_BUCKET_COUNT):
+        # Upper bound of each bucket, larger values go to an extra overflow bucket
+        self.bounds = [smallest * 2 ** index for index in range(bucket_count)]
+        self.counts = [0] * (bucket_count + 1)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value):
+        """
+        Adds a value
+        :param value: value (seconds for latencies)
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Approximate percentile
+        :param fraction: percentile as a fraction (0.99 for p99)
+        :return: end of the bucket that holds the percentile (capped by the largest value), 0 if empty
+        """
+        if self.total == 0:
+            return 0
+        rank = fraction * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def reset(self):
+        """
+        Clears every value
+        """
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def as_dict(self):
+        """
+        Structured copy of the histogram
+        :return: dictionary with count, mean, max, p50 / p90 / p99 and the non empty buckets as [end, count]
+        """
+        bounds = self.bounds + [None]
+        return {'count': self.total, 'mean': self.sum / self.total if self.total else 0, 'max': self.max,
+                'p50': self.percentile(0.5), 'p90': self.percentile(0.9), 'p99': self.percentile(0.99),
+                'buckets': [[bounds[index], count] for index, count in enumerate(self.counts) if count]}
@@ -0,0 +1,92 @@
+"""
+batchMatching.py
+Batch matching of many independent strings over a process pool sharing one compiled DFA
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+import os
+from contextlib import contextmanager
+from itertools import islice
+from dfaSerialization import save_dfa, load_dfa
+
+DEFAULT_CHUNK_SIZE = 4096
+DFA_FILE_NAME = 'automaton.dfa'
+
+# DFA of the current worker process, loaded once by initialize_worker
+worker_dfa = None
+
+
+def initialize_worker(path):
+    """
+    Loads the shared DFA in a pool worker. The file is memory mapped, so every worker reads the same
+    physical pages instead of receiving a pickled copy with each task
+    :param path: compiled DFA file
+    """
+    global worker_dfa
+    worker_dfa = load_dfa(path)
+
+
+@contextmanager
+def dfa_pool(dfa, workers):
+    """
+    Process pool whose workers share a compiled DFA through a temporary file, loaded once per worker
+    :param dfa: compiled DFA
+    :param workers: number of processes
+    :return: context manager with the pool, tasks read the DFA from worker_dfa
+    """
+    # Imported here so processes that never use a pool do not pay for multiprocessing at startup
+    import tempfile
+    from multiprocessing import Pool
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, DFA_FILE_NAME)
+        save_dfa(dfa, path)
+        with Pool(workers, initializer=initialize_worker, initargs=(path,)) as pool:
+            yield pool
+
+
+def match_batch(strings):
+    """
+    Matches a batch of strings in a pool worker
+    :param strings: list of strings
+    :return: list with match_tokens results
+    """
+    match_tokens = worker_dfa.match_tokens
+    return [match_tokens(string) for string in strings]
+
+
+def split_batches(strings, chunk_size):
+    """
+    Splits an iterable in lists of chunk_size items
+    :param strings: iterable of strings
+    :param chunk_size: strings per batch
+    :return: generator with lists of strings
+    """
+    iterator = iter(strings)
+    batch = list(islice(iterator, chunk_size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, chunk_size))
+
+
+def match_many(dfa, strings, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Matches many independent strings, spreading batches across a process pool
+    :param dfa: compiled DFA
+    :param strings: iterable of strings
+    :param workers: number of processes (os.cpu_count() by default, 1 matches in this process)
+    :param chunk_size: strings sent to a worker per task
+    :return: list with the match_tokens result of each string, in input order
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size < 1:
+        raise ValueError('The chunk size must be at least 1')
+    if workers <= 1:
+        return [dfa.match_tokens(string) for string in strings]
+
+    results = []
+    with dfa_pool(dfa, workers) as pool:
+        for batch_results in pool.imap(match_batch, split_batches(strings, chunk_size)):
+            results.extend(batch_results)
+    return results
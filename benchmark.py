@@ -0,0 +1,341 @@
+"""
+benchmark.py
+Benchmark runner for regex parsing, the three automaton constructions, matching and searching
+Pablo Ruiz 18259 (PingMaster99)
+
+Usage: python benchmark.py [--output results.json] [--baseline baseline.json] [--threshold 0.25]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from automaton import AutomatonGeneration, FiniteAutomaton
+from regexParser import parse_regex
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.25
+# Stages faster than this are too noisy to be compared against a baseline
+DEFAULT_MIN_SECONDS = 0.001
+WORD_CHARACTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def nested_stars(size):
+    """
+    ((a*)*)* nested size times, built without simplification (it would reduce to a*)
+    :param size: nesting depth
+    :return: (regex, matching input)
+    """
+    return '(' * size + 'a' + ')*' * size, 'a' * 1000
+
+
+def long_concatenation(size):
+    """
+    a.b.c... with size operands
+    :param size: number of concatenated characters
+    :return: (regex, matching input)
+    """
+    word = ''.join(WORD_CHARACTERS[index % len(WORD_CHARACTERS)] for index in range(size))
+    return '.'.join(word), word * max(1, 10000 // size)
+
+
+def wide_alternation(size):
+    """
+    (w1|w2|...) with size four letter words
+    :param size: number of alternatives
+    :return: (regex, matching input)
+    """
+    generator = random.Random(size)
+    words = list(dict.fromkeys(''.join(generator.choice(WORD_CHARACTERS) for _ in range(4)) for _ in range(size)))
+    regex = '(' + '|'.join('.'.join(word) for word in words) + ')'
+    return regex, ''.join(generator.choice(words) for _ in range(2500))
+
+
+def subset_blowup(size):
+    """
+    (a|b)*.a.(a|b)^n, its DFA has 2^(n+1) states
+    :param size: n
+    :return: (regex, matching input)
+    """
+    generator = random.Random(size)
+    string = ''.join(generator.choice('ab') for _ in range(10000)) + 'a' + 'b' * size
+    return '(a|b)*.a' + '.(a|b)' * size, string
+
+
+def bounded_repetition(size):
+    """
+    ((a|b).c){n/2,n}, repetitions are expanded by the constructions
+    :param size: n
+    :return: (regex, matching input)
+    """
+    generator = random.Random(size)
+    string = ''.join(generator.choice('ab') + 'c' for _ in range(size))
+    return '((a|b).c){%d,%d}' % (size // 2, size), string * max(1, 10000 // len(string))
+
+
+def long_input(size):
+    """
+    Small regex over a long matching input
+    :param size: input length
+    :return: (regex, matching input)
+    """
+    generator = random.Random(size)
+    return '([a-z]|[0-9])*.;', ''.join(generator.choice(WORD_CHARACTERS + '0123456789') for _ in range(size)) + ';'
+
+
+def rare_literal(size):
+    """
+    Literal led pattern searched in a long text where it occurs once, near the end
+    :param size: text length
+    :return: (regex, text)
+    """
+    generator = random.Random(size)
+    block = ''.join(generator.choice(WORD_CHARACTERS + ' ') for _ in range(1000))
+    text = (block * (size // len(block) + 1))[:size]
+    return 'e.r.r.o.r.:.[0-9]+', text[:-100] + 'error:42' + text[-92:]
+
+
+# Workload family: (builder, sizes, if the regex is simplified)
+FAMILIES = {
+    'nested_stars': (nested_stars, (4, 16, 64), False),
+    'long_concatenation': (long_concatenation, (16, 128, 512), True),
+    'wide_alternation': (wide_alternation, (8, 64, 256), True),
+    'subset_blowup': (subset_blowup, (4, 8, 12), True),
+    'bounded_repetition': (bounded_repetition, (16, 128, 1024), True),
+    'long_input': (long_input, (10000, 100000, 1000000), True),
+    'rare_literal': (rare_literal, (10000, 100000, 1000000), True),
+}
+QUICK_SIZES = 2
+
+
+def measure(function, repeat):
+    """
+    Times a function (best of repeat runs) and measures its peak memory in one more traced run
+    :param function: function without arguments
+    :param repeat: timed runs
+    :return: (result, metrics dictionary)
+    """
+    best_time = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {'seconds': best_time, 'peak_bytes': peak_memory}
+
+
+def run_stage(stages, name, function, repeat):
+    """
+    Measures one stage of a case, errors are recorded instead of stopping the run
+    :param stages: stage metrics of the case
+    :param name: stage name
+    :param function: function without arguments
+    :param repeat: timed runs
+    :return: stage result, None if it failed
+    """
+    try:
+        result, stages[name] = measure(function, repeat)
+        return result
+    except Exception as error:
+        stages[name] = {'error': f'{type(error).__name__}: {error}'}
+        return None
+
+
+def run_match(stages, name, automaton, string, repeat):
+    """
+    Measures match_tokens over an input, the matching engine is built before timing
+    :param stages: stage metrics of the case
+    :param name: stage name
+    :param automaton: automaton
+    :param string: input string
+    :param repeat: timed runs
+    """
+    if automaton is None:
+        return
+    automaton.matching_engine()
+    run_stage(stages, name, lambda: automaton.match_tokens(string), repeat)
+    if 'seconds' in stages[name]:
+        stages[name]['characters_per_second'] = len(string) / max(stages[name]['seconds'], 1e-9)
+
+
+def run_search(stages, name, automaton, string, repeat):
+    """
+    Measures finditer over an input (every match, with the literal prefilter of the automaton)
+    :param stages: stage metrics of the case
+    :param name: stage name
+    :param automaton: automaton
+    :param string: input string
+    :param repeat: timed runs
+    """
+    if automaton is None:
+        return
+    automaton.matching_engine()
+    run_stage(stages, name, lambda: list(automaton.finditer(string)), repeat)
+    if 'seconds' in stages[name]:
+        stages[name]['characters_per_second'] = len(string) / max(stages[name]['seconds'], 1e-9)
+
+
+def fresh_nfa(nfa):
+    """
+    Wraps the arrays of an NFA in a new automaton without its lazily built tables and engines
+    :param nfa: Thompson NFA
+    :return: NFA with the same compact arrays and literal prefilter
+    """
+    wrapper = FiniteAutomaton.from_compact(nfa.compact_nfa())
+    # The prefilter reaches the DFA through convert_to_dfa, so search_dfa times the real search path
+    wrapper.prefilter = nfa.prefilter
+    return wrapper
+
+
+def run_case(family, size, repeat):
+    """
+    Runs every stage of a workload case
+    :param family: workload family name
+    :param size: workload size
+    :param repeat: timed runs
+    :return: case results dictionary
+    """
+    builder, _, simplify = FAMILIES[family]
+    regex, string = builder(size)
+    stages = {}
+    case = {'family': family, 'size': size, 'regex_length': len(regex), 'input_length': len(string),
+            'stages': stages}
+
+    run_stage(stages, 'parse', lambda: parse_regex(regex, simplify).postfix(), repeat)
+    nfa = run_stage(stages, 'thompson', lambda: AutomatonGeneration(simplify=simplify).generate_thompson_nfa(regex),
+                    repeat)
+    dfa = None
+    if nfa is not None:
+        case['nfa_states'] = nfa.state_count
+        # Every run converts a fresh wrapper of the NFA arrays, so the closure table and the engine are rebuilt
+        dfa = run_stage(stages, 'subset', lambda: AutomatonGeneration().convert_to_dfa(fresh_nfa(nfa)), repeat)
+    if dfa is not None:
+        case['dfa_states'] = len(dfa.states)
+    direct_dfa = run_stage(stages, 'direct', lambda: AutomatonGeneration(simplify=simplify).direct_dfa_construction(
+        regex), repeat)
+    if direct_dfa is not None:
+        case['direct_dfa_states'] = len(direct_dfa.states)
+
+    run_match(stages, 'match_nfa', nfa, string, repeat)
+    run_match(stages, 'match_dfa', dfa, string, repeat)
+    run_search(stages, 'search_dfa', dfa, string, repeat)
+    return case
+
+
+def case_key(case):
+    """
+    Key that identifies a case across runs
+    :param case: case results
+    :return: 'family/size'
+    """
+    return f"{case['family']}/{case['size']}"
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """
+    Compares stage times against a baseline run
+    :param results: current run
+    :param baseline: baseline run
+    :param threshold: allowed slowdown ratio (0.25 = 25% slower)
+    :param min_seconds: stages faster than this in the baseline are skipped
+    :return: list of regression descriptions
+    """
+    baseline_cases = {case_key(case): case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        baseline_case = baseline_cases.get(case_key(case))
+        if baseline_case is None:
+            continue
+        for stage, metrics in case['stages'].items():
+            baseline_metrics = baseline_case['stages'].get(stage, {})
+            if 'seconds' not in baseline_metrics or baseline_metrics['seconds'] < min_seconds:
+                continue
+            if 'seconds' not in metrics:
+                regressions.append(f"{case_key(case)} {stage}: {metrics.get('error')}")
+                continue
+            ratio = metrics['seconds'] / baseline_metrics['seconds']
+            if ratio > 1 + threshold:
+                regressions.append(f"{case_key(case)} {stage}: {baseline_metrics['seconds']:.4f}s -> "
+                                   f"{metrics['seconds']:.4f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def run_benchmarks(families, repeat, quick=False):
+    """
+    Runs the selected workload families
+    :param families: family names
+    :param repeat: timed runs per stage
+    :param quick: if only the smallest sizes run
+    :return: results dictionary
+    """
+    cases = []
+    for family in families:
+        _, sizes, _ = FAMILIES[family]
+        for size in sizes[:QUICK_SIZES] if quick else sizes:
+            case = run_case(family, size, repeat)
+            cases.append(case)
+            print(format_case(case), file=sys.stderr)
+    return {'python': sys.version.split()[0], 'repeat': repeat, 'cases': cases}
+
+
+def format_case(case):
+    """
+    One line summary of a case
+    :param case: case results
+    :return: summary
+    """
+    stage_summaries = []
+    for stage, metrics in case['stages'].items():
+        if 'seconds' in metrics:
+            stage_summaries.append(f"{stage}={metrics['seconds'] * 1000:.1f}ms")
+        else:
+            stage_summaries.append(f'{stage}=error')
+    return f"{case_key(case):<28} nfa={case.get('nfa_states', '-')} dfa={case.get('dfa_states', '-')} " + \
+        ' '.join(stage_summaries)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Regex and automaton benchmarks')
+    parser.add_argument('--families', nargs='+', choices=sorted(FAMILIES), default=list(FAMILIES))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--quick', action='store_true', help='only the smallest sizes of each family')
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown before failing (0.25 = 25%%)')
+    parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS,
+                        help='baseline stages faster than this are not compared')
+    options = parser.parse_args(arguments)
+
+    results = run_benchmarks(options.families, options.repeat, options.quick)
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, options.threshold, options.min_seconds)
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+compactNfa.py
+Struct-of-arrays NFA storage: Thompson NFAs as parallel integer arrays instead of State objects
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from array import array
+from dataStructures import State
+from alphabet import EPSILON, Repetition, as_character_class
+
+# Edge index used when a state has no edge
+NO_EDGE = -1
+# Symbol of states whose edges are ε transitions
+EPSILON_SYMBOL = -1
+INDEX_TYPECODE = 'i'
+
+# State flags
+ACCEPTANCE_FLAG = 1
+INITIAL_FLAG = 2
+# Thompson numbers the states of literals and positive closures as (accept, initial) but stores them as
+# (initial, accept), so the displayed state number of those states is index ^ 1
+SWAPPED_NUMBER_FLAG = 4
+
+
+def indexes_to_bitset(indexes, size):
+    """
+    Builds an integer bitset through a byte bitmap (linear, instead of growing one big int per index)
+    :param indexes: iterable of state indexes
+    :param size: number of states
+    :return: bitset
+    """
+    bitmap = bytearray((size + 7) // 8)
+    for index in indexes:
+        bitmap[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+class CompactNFA(object):
+    """
+    NFA stored as parallel arrays indexed by state number. A state either has one symbol transition
+    (symbol = character class id, target in edge1) or up to two ε transitions (symbol = EPSILON_SYMBOL),
+    which is every shape Thompson's construction produces. About 13 bytes per state
+    """
+
+    def __init__(self):
+        self.symbols = array(INDEX_TYPECODE)
+        self.edge1 = array(INDEX_TYPECODE)
+        self.edge2 = array(INDEX_TYPECODE)
+        self.flags = bytearray()
+        # Distinct character classes, symbols are indexes into this list
+        self.character_classes = []
+        self.class_ids = {}
+        self.initial_state = NO_EDGE
+
+    @property
+    def state_count(self):
+        """
+        Number of states
+        """
+        return len(self.flags)
+
+    def add_state(self, flags=0):
+        """
+        Adds a state without transitions
+        :param flags: state flags
+        :return: state index
+        """
+        self.symbols.append(EPSILON_SYMBOL)
+        self.edge1.append(NO_EDGE)
+        self.edge2.append(NO_EDGE)
+        self.flags.append(flags)
+        return len(self.flags) - 1
+
+    def class_id(self, character_class):
+        """
+        Gets the id of a character class, registering it if it is new
+        :param character_class: character class
+        :return: class id
+        """
+        identifier = self.class_ids.get(character_class)
+        if identifier is None:
+            identifier = len(self.character_classes)
+            self.class_ids[character_class] = identifier
+            self.character_classes.append(character_class)
+        return identifier
+
+    def set_epsilon(self, state, edge1, edge2=NO_EDGE):
+        """
+        Sets the ε transitions of a state
+        :param state: state index
+        :param edge1: first target
+        :param edge2: second target (NO_EDGE if there is none)
+        """
+        self.symbols[state] = EPSILON_SYMBOL
+        self.edge1[state] = edge1
+        self.edge2[state] = edge2
+
+    def set_symbol(self, state, character_class, edge):
+        """
+        Sets the symbol transition of a state
+        :param state: state index
+        :param character_class: transition character class
+        :param edge: target
+        """
+        self.symbols[state] = self.class_id(character_class)
+        self.edge1[state] = edge
+        self.edge2[state] = NO_EDGE
+
+    def closure(self, fragment, positive=False):
+        """
+        Wraps a fragment in a Kleene or positive closure
+        :param fragment: (initial state, acceptance state)
+        :param positive: if the fragment must be matched at least once
+        :return: closure fragment
+        """
+        nfa1_initial, nfa1_accept = fragment
+        if positive:
+            initial, accept = self.add_state(SWAPPED_NUMBER_FLAG), self.add_state(SWAPPED_NUMBER_FLAG)
+            self.set_epsilon(initial, nfa1_initial)
+        else:
+            initial, accept = self.add_state(), self.add_state()
+            # We join the automaton, old accept state goes to the new accept state and NFA's initial state
+            self.set_epsilon(initial, nfa1_initial, accept)
+        self.set_epsilon(nfa1_accept, nfa1_initial, accept)
+        return initial, accept
+
+    def copy_states(self, first_state, copies):
+        """
+        Appends copies of the states from first_state to the last one (a finished fragment, whose edges stay
+        inside it). Each copy is a block copy of the arrays with its edges shifted
+        :param first_state: first state of the fragment
+        :param copies: number of copies
+        :return: list with the offset of each copy
+        """
+        end = self.state_count
+        offsets = []
+        for _ in range(copies):
+            offset = self.state_count - first_state
+            offsets.append(offset)
+            self.symbols.extend(self.symbols[first_state:end])
+            self.flags.extend(self.flags[first_state:end])
+            for edges in (self.edge1, self.edge2):
+                edges.extend(edge if edge == NO_EDGE else edge + offset for edge in edges[first_state:end])
+        return offsets
+
+    def repetition(self, fragment, first_state, repetition):
+        """
+        Builds r{m,n} from the fragment of r: m chained copies, then r* / r+ for unbounded repetitions or
+        nested optional copies (r(r(r)?)?)? with one gate state each, so ε closures stay small
+        :param fragment: (initial state, acceptance state) of r
+        :param first_state: first state of the fragment of r
+        :param repetition: Repetition
+        :return: repetition fragment
+        """
+        minimum, maximum = repetition.minimum, repetition.maximum
+        copies = max(minimum, 1) if maximum is None else maximum
+        nfa1_initial, nfa1_accept = fragment
+        fragments = [fragment] + [(nfa1_initial + offset, nfa1_accept + offset)
+                                  for offset in self.copy_states(first_state, copies - 1)]
+
+        if maximum is None:
+            fragments[-1] = self.closure(fragments[-1], positive=minimum > 0)
+            required, optional = fragments, []
+        else:
+            required, optional = fragments[:minimum], fragments[minimum:]
+
+        if optional:
+            exit_state = self.add_state()
+            gates = [self.add_state() for _ in optional]
+            for index, (gate, (optional_initial, optional_accept)) in enumerate(zip(gates, optional)):
+                self.set_epsilon(gate, optional_initial, exit_state)
+                self.set_epsilon(optional_accept, gates[index + 1] if index + 1 < len(gates) else exit_state)
+            required.append((gates[0], exit_state))
+
+        for (_, previous_accept), (next_initial, _) in zip(required, required[1:]):
+            self.set_epsilon(previous_accept, next_initial)
+        return required[0][0], required[-1][1]
+
+    @classmethod
+    def from_postfix(cls, postfix):
+        """
+        Generates a Thompson NFA from a postfix regex, straight into the arrays
+        Inspired by niemaattarian
+        :param postfix: postfix tokens
+        :return: compact NFA
+        """
+        compact = cls()
+        # Fragments are (initial state, acceptance state, first state), the states of a fragment are the
+        # consecutive indexes from its first state
+        nfa_stack = []
+
+        for c in postfix:
+            # Kleene base automaton
+            if c == '*' or c == '+':
+                nfa1_initial, nfa1_accept, first_state = nfa_stack.pop()
+                initial, accept = compact.closure((nfa1_initial, nfa1_accept), positive=c == '+')
+                nfa_stack.append((initial, accept, first_state))
+            # Concatenation
+            elif c == '.':
+                (nfa2_initial, nfa2_accept, _), (nfa1_initial, nfa1_accept, first_state) = \
+                    nfa_stack.pop(), nfa_stack.pop()
+                compact.set_epsilon(nfa1_accept, nfa2_initial)
+                nfa_stack.append((nfa1_initial, nfa2_accept, first_state))
+            # Or
+            elif c == '|':
+                (nfa2_initial, nfa2_accept, _), (nfa1_initial, nfa1_accept, first_state) = \
+                    nfa_stack.pop(), nfa_stack.pop()
+                initial, accept = compact.add_state(), compact.add_state()
+                compact.set_epsilon(initial, nfa1_initial, nfa2_initial)
+                compact.set_epsilon(nfa1_accept, accept)
+                compact.set_epsilon(nfa2_accept, accept)
+                nfa_stack.append((initial, accept, first_state))
+            # Bounded repetition
+            elif isinstance(c, Repetition):
+                nfa1_initial, nfa1_accept, first_state = nfa_stack.pop()
+                initial, accept = compact.repetition((nfa1_initial, nfa1_accept), first_state, c)
+                nfa_stack.append((initial, accept, first_state))
+            else:
+                # Base case for literals, the initial state is stored right before the acceptance state
+                initial, accept = compact.add_state(SWAPPED_NUMBER_FLAG), compact.add_state(SWAPPED_NUMBER_FLAG)
+                if c == EPSILON:
+                    compact.set_epsilon(initial, accept)
+                else:
+                    compact.set_symbol(initial, c, accept)
+                nfa_stack.append((initial, accept, initial))
+
+        initial, accept, _ = nfa_stack.pop()
+        compact.flags[initial] |= INITIAL_FLAG
+        compact.flags[accept] |= ACCEPTANCE_FLAG
+        compact.initial_state = initial
+        return compact
+
+    @classmethod
+    def from_states(cls, states, initial_state, acceptance_states):
+        """
+        Converts a linked NFA with Thompson shaped states
+        :param states: list of states
+        :param initial_state: initial state
+        :param acceptance_states: acceptance states
+        :return: compact NFA
+        """
+        compact = cls()
+        state_indexes = {id(state): index for index, state in enumerate(states)}
+        for state in states:
+            index = compact.add_state()
+            transitions = state.transitions()
+            if any(identifier != EPSILON for identifier, _ in transitions):
+                if len(transitions) != 1:
+                    raise ValueError('Only NFAs with Thompson shaped states can be stored compactly')
+                identifier, edge = transitions[0]
+                compact.set_symbol(index, as_character_class(identifier), state_indexes[id(edge)])
+            elif len(transitions) > 2:
+                raise ValueError('Only NFAs with Thompson shaped states can be stored compactly')
+            elif len(transitions) > 0:
+                targets = [state_indexes[id(edge)] for _, edge in transitions]
+                compact.set_epsilon(index, *targets)
+
+        for state in acceptance_states:
+            compact.flags[state_indexes[id(state)]] |= ACCEPTANCE_FLAG
+        compact.initial_state = state_indexes[id(initial_state)]
+        compact.flags[compact.initial_state] |= INITIAL_FLAG
+        return compact
+
+    @classmethod
+    def join_rules(cls, rule_nfas):
+        """
+        Joins several NFAs with a shared initial state (a tree of ε transitions). States are renumbered in
+        order: the joining states first, then the states of each NFA, which keep their relative order
+        :param rule_nfas: list of compact NFAs
+        :return: joined compact NFA, list with the acceptance state of each NFA
+        """
+        compact = cls()
+        # Two ε edges per state, so the initial states are joined in pairs
+        pairs = []
+        entry_count = len(rule_nfas)
+        while entry_count > 1:
+            pairs.append(entry_count // 2)
+            entry_count = (entry_count + 1) // 2
+        for _ in range(sum(pairs)):
+            compact.add_state()
+
+        rule_acceptance_states = []
+        entries = []
+        for rule_nfa in rule_nfas:
+            offset = compact.state_count
+            entries.append(rule_nfa.initial_state + offset)
+            for index in range(rule_nfa.state_count):
+                compact.add_state(rule_nfa.flags[index] & ACCEPTANCE_FLAG)
+                edge1, edge2 = rule_nfa.edge1[index], rule_nfa.edge2[index]
+                state = index + offset
+                if rule_nfa.symbols[index] == EPSILON_SYMBOL:
+                    compact.set_epsilon(state, NO_EDGE if edge1 == NO_EDGE else edge1 + offset,
+                                        NO_EDGE if edge2 == NO_EDGE else edge2 + offset)
+                else:
+                    compact.set_symbol(state, rule_nfa.character_classes[rule_nfa.symbols[index]], edge1 + offset)
+            rule_acceptance_states.append(rule_nfa.acceptance_indexes()[0] + offset)
+
+        fan_out_state = 0
+        for pair_count in pairs:
+            joined_entries = []
+            for index in range(0, 2 * pair_count, 2):
+                compact.set_epsilon(fan_out_state, entries[index], entries[index + 1])
+                joined_entries.append(fan_out_state)
+                fan_out_state += 1
+            if len(entries) % 2 == 1:
+                joined_entries.append(entries[-1])
+            entries = joined_entries
+
+        compact.initial_state = entries[0]
+        compact.flags[compact.initial_state] |= INITIAL_FLAG
+        return compact, rule_acceptance_states
+
+    def acceptance_indexes(self):
+        """
+        Gets the acceptance states
+        :return: list of state indexes
+        """
+        return [index for index, flags in enumerate(self.flags) if flags & ACCEPTANCE_FLAG]
+
+    def acceptance_bitset(self):
+        """
+        Gets the acceptance states as a bitset
+        :return: bitset
+        """
+        return indexes_to_bitset(self.acceptance_indexes(), self.state_count)
+
+    def epsilon_edges(self):
+        """
+        Gets the ε targets of every state
+        :return: (first targets, second targets) arrays, NO_EDGE where there is no ε transition
+        """
+        first_targets = array(INDEX_TYPECODE, self.edge1)
+        second_targets = array(INDEX_TYPECODE, self.edge2)
+        for index, symbol in enumerate(self.symbols):
+            if symbol != EPSILON_SYMBOL:
+                first_targets[index] = NO_EDGE
+        return first_targets, second_targets
+
+    def link_states(self):
+        """
+        Builds the linked State graph (only needed to display the automaton)
+        :return: (list of states, initial state, list of acceptance states)
+        """
+        states = []
+        for index, flags in enumerate(self.flags):
+            state = State(index ^ 1 if flags & SWAPPED_NUMBER_FLAG else index)
+            state.is_acceptance = bool(flags & ACCEPTANCE_FLAG)
+            if flags & INITIAL_FLAG:
+                state.is_initial = True
+                state.state_number = '→' + state.state_number
+            states.append(state)
+
+        for index, state in enumerate(states):
+            edge1, edge2 = self.edge1[index], self.edge2[index]
+            if self.symbols[index] != EPSILON_SYMBOL:
+                state.identifier1, state.edge1 = self.character_classes[self.symbols[index]], states[edge1]
+                continue
+            if edge1 != NO_EDGE:
+                state.identifier1, state.edge1 = EPSILON, states[edge1]
+            if edge2 != NO_EDGE:
+                state.identifier2, state.edge2 = EPSILON, states[edge2]
+        return states, states[self.initial_state], [states[index] for index in self.acceptance_indexes()]
@@ -0,0 +1,380 @@
+"""
+compiledAutomaton.py
+Matching engines and array-backed transition tables for deterministic automatons
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from array import array
+from collections import deque
+
+# Transition target used when a state has no transition with a symbol
+DEAD_STATE = -1
+# Transition tables hold signed 32 bit state numbers
+TRANSITION_TYPECODE = 'i'
+INVALID_TOKENS_MESSAGE = 'EXPRESIÓN INVÁLIDA, Tokens inválidos ->'
+
+
+class TokenizationError(ValueError):
+    """
+    Raised when no token can be matched at a position of the input
+    """
+
+    def __init__(self, position):
+        super().__init__(f'Ningún token coincide en la posición {position}')
+        self.position = position
+
+
+class MatchingEngine(object):
+    """
+    Base class for matching engines, subclasses implement longest_match and accepts_empty
+    """
+
+    def longest_match(self, string, start=0):
+        """
+        Finds the longest non-empty accepted prefix of string[start:]
+        :param string: input string
+        :param start: position where the match begins
+        :return: end position of the match, -1 if there is none
+        """
+        raise NotImplementedError
+
+    def accepts_empty(self):
+        """
+        Checks if the empty string is accepted
+        :return: True if the initial state is an acceptance state
+        """
+        raise NotImplementedError
+
+    def iter_token_spans(self, string, start=0):
+        """
+        Splits a string in tokens with maximal munch, lazily. Every scan stops at the first dead state
+        :param string: string to tokenize
+        :param start: position where tokenization begins
+        :return: generator with (start, end) spans over string
+        :raises TokenizationError: when no token matches at a position
+        """
+        position = start
+        length = len(string)
+        longest_match = self.longest_match
+
+        while position < length:
+            end = longest_match(string, position)
+            if end < 0:
+                raise TokenizationError(position)
+            yield position, end
+            position = end
+
+    def token_spans(self, string):
+        """
+        Splits a string in tokens with maximal munch
+        :param string: string to tokenize
+        :return: list with (start, end) spans over string
+        :raises TokenizationError: when no token matches at a position
+        """
+        return list(self.iter_token_spans(string))
+
+    def search(self, string, start=0, prefilter=None):
+        """
+        Finds the leftmost longest non-empty match anywhere in string[start:]
+        :param string: input string
+        :param start: position where the search begins
+        :param prefilter: optional LiteralPrefilter of the regex, only its candidate positions are tried
+        :return: (start, end) span of the match, None if there is none
+        """
+        longest_match = self.longest_match
+        positions = range(start, len(string)) if prefilter is None else prefilter.candidates(string, start)
+        for position in positions:
+            end = longest_match(string, position)
+            if end >= 0:
+                return position, end
+        return None
+
+    def finditer(self, string, start=0, prefilter=None):
+        """
+        Finds the non-overlapping leftmost longest non-empty matches of string[start:], lazily
+        :param string: input string
+        :param start: position where the search begins
+        :param prefilter: optional LiteralPrefilter of the regex
+        :return: generator with (start, end) spans over string
+        """
+        span = self.search(string, start, prefilter)
+        while span is not None:
+            yield span
+            span = self.search(string, span[1], prefilter)
+
+    def match_tokens(self, string):
+        """
+        Matches an input string and generates tokens (longest match first)
+        :param string: string to validate
+        :return: if string is valid + tokens
+        """
+        tokens = []
+
+        try:
+            for start, end in self.iter_token_spans(string):
+                tokens.append(string[start:end])
+        except TokenizationError as error:
+            tokens.append(INVALID_TOKENS_MESSAGE)
+            tokens.append(string[error.position:])
+            return False, tokens
+
+        if len(tokens) > 0 or self.accepts_empty():
+            return True, tokens
+
+        tokens.append(INVALID_TOKENS_MESSAGE)
+        tokens.append(string)
+        return False, tokens
+
+
+class CompiledDFA(MatchingEngine):
+    """
+    Deterministic automaton stored as a dense (state x symbol) transition table
+    """
+
+    def __init__(self, symbol_classes, transitions, acceptance, initial_state=0, acceptance_rules=None):
+        # One table column per symbol class, characters outside every class use the default column (if any)
+        self.symbol_classes = symbol_classes
+        self.symbol_codes = symbol_classes.class_of
+        self.default_code = symbol_classes.default_class
+        self.symbol_count = symbol_classes.class_count
+        self.transitions = transitions
+        self.acceptance = acceptance
+        self.initial_state = initial_state
+        self.state_count = len(acceptance)
+        # Rule accepted by each state for multi-rule lexers (-1 when the state does not accept)
+        self.acceptance_rules = acceptance_rules
+        # Backing buffer (mmap) when the tables are views over a loaded file
+        self.buffer = None
+
+    @classmethod
+    def from_automaton(cls, automaton):
+        """
+        Compiles a deterministic FiniteAutomaton into a transition table
+        :param automaton: deterministic automaton
+        :return: compiled DFA
+        """
+        if not automaton.is_deterministic:
+            raise ValueError('Only deterministic automatons can be compiled into a transition table')
+
+        states = automaton.states
+        state_indexes = {id(state): index for index, state in enumerate(states)}
+        symbol_classes = automaton.symbol_classes()
+        label_codes = {label: code for code, label in enumerate(symbol_classes.labels)}
+        symbol_count = symbol_classes.class_count
+
+        transitions = array(TRANSITION_TYPECODE, [DEAD_STATE]) * (len(states) * symbol_count)
+        acceptance = bytearray(len(states))
+        for index, state in enumerate(states):
+            row = index * symbol_count
+            for identifier, edge in state.transitions():
+                transitions[row + label_codes[identifier]] = state_indexes[id(edge)]
+            if state.is_acceptance:
+                acceptance[index] = 1
+
+        for state in automaton.acceptance_states:
+            acceptance[state_indexes[id(state)]] = 1
+
+        return cls(symbol_classes, transitions, acceptance, state_indexes[id(automaton.initial_state)])
+
+    def step(self, state, symbol):
+        """
+        Moves from a state with a symbol
+        :param state: current state number
+        :param symbol: input symbol
+        :return: next state number (DEAD_STATE if there is no transition)
+        """
+        code = self.symbol_codes[symbol]
+        if code is None or state == DEAD_STATE:
+            return DEAD_STATE
+        return self.transitions[state * self.symbol_count + code]
+
+    def longest_match(self, string, start=0):
+        """
+        Finds the longest non-empty accepted prefix of string[start:]
+        :param string: input string
+        :param start: position where the match begins
+        :return: end position of the match, -1 if there is none
+        """
+        transitions = self.transitions
+        acceptance = self.acceptance
+        symbol_codes = self.symbol_codes
+        width = self.symbol_count
+        state = self.initial_state
+        last_acceptance = -1
+
+        for position in range(start, len(string)):
+            code = symbol_codes[string[position]]
+            if code is None:
+                break
+            state = transitions[state * width + code]
+            if state < 0:
+                break
+            if acceptance[state]:
+                last_acceptance = position + 1
+        return last_acceptance
+
+    def longest_rule_match(self, string, start=0):
+        """
+        Finds the longest non-empty accepted prefix of string[start:] and the rule it belongs to
+        :param string: input string
+        :param start: position where the match begins
+        :return: (end position, rule number), (-1, -1) if there is no match
+        """
+        transitions = self.transitions
+        acceptance_rules = self.acceptance_rules
+        symbol_codes = self.symbol_codes
+        width = self.symbol_count
+        state = self.initial_state
+        last_acceptance = -1
+        last_rule = -1
+
+        for position in range(start, len(string)):
+            code = symbol_codes[string[position]]
+            if code is None:
+                break
+            state = transitions[state * width + code]
+            if state < 0:
+                break
+            if acceptance_rules[state] >= 0:
+                last_acceptance = position + 1
+                last_rule = acceptance_rules[state]
+        return last_acceptance, last_rule
+
+    def accepts(self, string):
+        """
+        Checks if the whole string belongs to the language
+        :param string: input string
+        :return: True if accepted
+        """
+        transitions = self.transitions
+        symbol_codes = self.symbol_codes
+        width = self.symbol_count
+        state = self.initial_state
+
+        for character in string:
+            code = symbol_codes[character]
+            if code is None:
+                return False
+            state = transitions[state * width + code]
+            if state < 0:
+                return False
+        return bool(self.acceptance[state])
+
+    def accepts_empty(self):
+        """
+        Checks if the empty string is accepted
+        :return: True if the initial state is an acceptance state
+        """
+        return bool(self.acceptance[self.initial_state])
+
+    def minimized(self):
+        """
+        Minimizes the DFA with Hopcroft's partition refinement, O(k n log n).
+        Missing transitions go to an implicit dead state, states that can not reach acceptance are removed.
+        States accepting different rules are never merged
+        :return: minimal compiled DFA, states numbered in breadth first order from the initial state
+        """
+        width = self.symbol_count
+        transitions = self.transitions
+        dead_state = self.state_count
+        state_count = self.state_count + 1
+
+        # Inverse transitions (dead state included, it loops to itself)
+        inverse = [[[] for _ in range(state_count)] for _ in range(width)]
+        for state in range(state_count):
+            for code in range(width):
+                target = transitions[state * width + code] if state != dead_state else dead_state
+                if target == DEAD_STATE:
+                    target = dead_state
+                inverse[code][target].append(state)
+
+        # Initial partition by accepted rule (or plain acceptance), the dead state rejects
+        labeled_blocks = {}
+        for state in range(state_count):
+            if state == dead_state:
+                label = -1
+            elif self.acceptance_rules is not None:
+                label = self.acceptance_rules[state]
+            else:
+                label = 0 if self.acceptance[state] else -1
+            labeled_blocks.setdefault(label, set()).add(state)
+        blocks = list(labeled_blocks.values())
+        block_of = [0] * state_count
+        for block_id, block in enumerate(blocks):
+            for state in block:
+                block_of[state] = block_id
+
+        # Every initial block but the largest one is a splitter
+        largest_block = max(range(len(blocks)), key=lambda block_id: len(blocks[block_id]))
+        pending_splitters = deque(block_id for block_id in range(len(blocks)) if block_id != largest_block)
+        pending = set(pending_splitters)
+
+        while pending_splitters:
+            splitter = pending_splitters.popleft()
+            pending.discard(splitter)
+            splitter_states = list(blocks[splitter])
+            for code in range(width):
+                predecessors = {}
+                for target in splitter_states:
+                    for source in inverse[code][target]:
+                        predecessors.setdefault(block_of[source], set()).add(source)
+
+                for block_id, sources in predecessors.items():
+                    block = blocks[block_id]
+                    if len(sources) == len(block):
+                        continue
+                    block -= sources
+                    new_block_id = len(blocks)
+                    blocks.append(sources)
+                    for state in sources:
+                        block_of[state] = new_block_id
+                    if block_id in pending or len(sources) <= len(block):
+                        pending_splitters.append(new_block_id)
+                        pending.add(new_block_id)
+                    else:
+                        pending_splitters.append(block_id)
+                        pending.add(block_id)
+
+        # Minimal states are numbered from the initial block, the dead block is dropped
+        dead_block = block_of[dead_state]
+        representatives = {block_id: next(iter(block)) for block_id, block in enumerate(blocks)}
+        initial_block = block_of[self.initial_state]
+        new_numbers = {}
+        order = []
+        if initial_block != dead_block:
+            new_numbers[initial_block] = 0
+            order.append(initial_block)
+        index = 0
+        while index < len(order):
+            representative = representatives[order[index]]
+            index += 1
+            for code in range(width):
+                target = transitions[representative * width + code]
+                if target == DEAD_STATE or block_of[target] == dead_block:
+                    continue
+                if block_of[target] not in new_numbers:
+                    new_numbers[block_of[target]] = len(order)
+                    order.append(block_of[target])
+
+        if len(order) == 0:
+            # Empty language: a single rejecting state without transitions
+            empty_rules = None if self.acceptance_rules is None else array(TRANSITION_TYPECODE, [-1])
+            return CompiledDFA(self.symbol_classes, array(TRANSITION_TYPECODE, [DEAD_STATE]) * width, bytearray(1), 0,
+                               empty_rules)
+
+        minimal_transitions = array(TRANSITION_TYPECODE, [DEAD_STATE]) * (len(order) * width)
+        minimal_acceptance = bytearray(len(order))
+        minimal_rules = None
+        if self.acceptance_rules is not None:
+            minimal_rules = array(TRANSITION_TYPECODE, [-1]) * len(order)
+        for number, block_id in enumerate(order):
+            representative = representatives[block_id]
+            minimal_acceptance[number] = self.acceptance[representative]
+            if minimal_rules is not None:
+                minimal_rules[number] = self.acceptance_rules[representative]
+            for code in range(width):
+                target = transitions[representative * width + code]
+                if target != DEAD_STATE and block_of[target] in new_numbers:
+                    minimal_transitions[number * width + code] = new_numbers[block_of[target]]
+
+        return CompiledDFA(self.symbol_classes, minimal_transitions, minimal_acceptance, 0, minimal_rules)
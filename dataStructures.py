@@ -1,6 +1,6 @@
 """
 dataStructures.py
-Data structures used in the program (states, nodes, trees)
+Data structures used in the program (states and nodes)
 Pablo Ruiz 18259 (PingMaster99)
 """
 
@@ -16,28 +16,6 @@ class Node(object):
         self.edge2 = edge2
 
 
-class SyntacticTree(object):
-    """
-    Syntactic tree
-    """
-    def __init__(self, root=None):
-        self.root = root
-
-
-class DirectConstructionNode(Node):
-    """
-    Nodes for direct construction
-    """
-    def __init__(self, index=None, character=None, first_position=None, last_position=None, nullable=False):
-        super().__init__()
-        self.index = index
-        self.character = character
-        self.nullable = nullable
-        self.first_position = first_position
-        self.last_position = last_position
-        self.next_position = set([])
-
-
 class State(Node):
     """
     Automata states
@@ -47,42 +25,43 @@ class State(Node):
         self.state_number = str(state_number)
         self.is_initial = False
         self.is_acceptance = False
+        # Transitions beyond the two Node edges (DFA states over larger alphabets)
+        self.extra_edges = []
 
-
-# Based on: https://github.com/niemaattarian/Thompsons-Construction-on-NFAs/blob/master/Project.py
-def shunting_yard_algorithm(infix):
-    """
-    Generates a postfix expression from an infix one
-    :param infix: infix
-    :return: postfix
-    """
-    # Precedence of operators (higher = higher priority)
-    operators = {'*': 4, '+': 3, '.': 2, '|': 1}
-
-    postfix, stack = [], []
-
-    # We iterate through all characters
-    for character in infix:
-        if character == '(':
-            stack.append(character)
-
-        # Parenthesis check
-        elif character == ')':
-            while stack[-1] != '(':
-                postfix.append(stack.pop())
-            stack.pop()  # Removal of the opening bracket
-        # Determine whether the character is in the 'operators' dictionary
-        elif character in operators:
-            while stack and operators.get(character, 0) <= operators.get(stack[-1], 0):
-                postfix.append(stack.pop())
-            stack.append(character)  # We check for operator precedence
+    def add_transition(self, identifier, edge):
+        """
+        Adds a transition, the Node edges are used first
+        :param identifier: transition symbol
+        :param edge: target state
+        """
+        if self.edge1 is None:
+            self.identifier1, self.edge1 = identifier, edge
+        elif self.edge2 is None:
+            self.identifier2, self.edge2 = identifier, edge
         else:
-            # Character is appended to postfix
-            postfix.append(character)
+            self.extra_edges.append((identifier, edge))
+
+    def transitions(self):
+        """
+        Gets every transition of the state
+        :return: list of (identifier, target state)
+        """
+        state_transitions = []
+        if self.edge1 is not None:
+            state_transitions.append((self.identifier1, self.edge1))
+        if self.edge2 is not None:
+            state_transitions.append((self.identifier2, self.edge2))
+        state_transitions.extend(self.extra_edges)
+        return state_transitions
 
-    # We append to the postfix the ordered stack
-    while stack:
-        postfix.append(stack.pop())
 
-    # returns postfix argument
-    return postfix
+def bitset_indexes(bitset):
+    """
+    Iterates the indexes of the bits set in an integer bitset (lowest first)
+    :param bitset: integer bitset
+    :return: generator with bit indexes
+    """
+    while bitset:
+        lowest_bit = bitset & -bitset
+        yield lowest_bit.bit_length() - 1
+        bitset ^= lowest_bit
@@ -0,0 +1,167 @@
+"""
+dfaSerialization.py
+Compact binary format for compiled DFAs, loadable through mmap
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from compiledAutomaton import CompiledDFA, TRANSITION_TYPECODE
+from alphabet import SymbolClasses
+
+# File layout (little endian):
+#   header     magic, version, flags, state count, symbol class count, initial state, default class,
+#              alphabet size in bytes
+#   alphabet   u32 segment count, then the code point segments of the symbol classes: u32 first code point +
+#              int32 class code each (-1 = characters no transition uses)
+#   padding    up to a multiple of 8 bytes
+#   table      state count * symbol class count int32 transitions (-1 = dead state)
+#   acceptance one byte per state
+#   rules      only with the RULES_FLAG: padding up to a multiple of 8 bytes and one int32 rule per state
+MAGIC = b'PDFA'
+FORMAT_VERSION = 3
+HEADER = struct.Struct('<4sHHIIIII')
+SEGMENT_COUNT = struct.Struct('<I')
+SEGMENT = struct.Struct('<Ii')
+NO_CLASS = -1
+NO_DEFAULT_CLASS = 0xFFFFFFFF
+RULES_FLAG = 1
+ALIGNMENT = 8
+
+
+def encode_alphabet(symbol_classes):
+    """
+    Encodes the DFA symbol classes
+    :param symbol_classes: symbol classes
+    :return: bytes
+    """
+    encoded_alphabet = bytearray(SEGMENT_COUNT.pack(len(symbol_classes.boundaries)))
+    for boundary, code in zip(symbol_classes.boundaries, symbol_classes.segment_codes):
+        encoded_alphabet += SEGMENT.pack(boundary, NO_CLASS if code is None else code)
+    return bytes(encoded_alphabet)
+
+
+def decode_alphabet(buffer, offset, symbol_count, default_class):
+    """
+    Decodes the DFA symbol classes
+    :param buffer: file contents
+    :param offset: alphabet offset
+    :param symbol_count: number of symbol classes
+    :param default_class: default class code (NO_DEFAULT_CLASS if there is none)
+    :return: symbol classes
+    """
+    (segment_count,) = SEGMENT_COUNT.unpack_from(buffer, offset)
+    offset += SEGMENT_COUNT.size
+    boundaries = []
+    segment_codes = []
+    for _ in range(segment_count):
+        boundary, code = SEGMENT.unpack_from(buffer, offset)
+        offset += SEGMENT.size
+        boundaries.append(boundary)
+        segment_codes.append(None if code == NO_CLASS else code)
+    return SymbolClasses(boundaries, segment_codes, symbol_count,
+                         None if default_class == NO_DEFAULT_CLASS else default_class)
+
+
+def int32_bytes(values):
+    """
+    Encodes a table of int32 values in little endian
+    :param values: int sequence
+    :return: bytes
+    """
+    table = array(TRANSITION_TYPECODE, values)
+    if sys.byteorder != 'little':
+        table.byteswap()
+    return table.tobytes()
+
+
+def int32_view(view, start, end):
+    """
+    Reads a little endian int32 table, without copying it on little endian machines
+    :param view: memoryview over the file
+    :param start: table start
+    :param end: table end
+    :return: indexable int table
+    """
+    if sys.byteorder == 'little':
+        return view[start:end].cast(TRANSITION_TYPECODE)
+    table = array(TRANSITION_TYPECODE, view[start:end].tobytes())
+    table.byteswap()
+    return table
+
+
+def save_dfa(dfa, path):
+    """
+    Saves a DFA in the binary format
+    :param dfa: deterministic FiniteAutomaton or CompiledDFA
+    :param path: file path
+    """
+    compiled_dfa = dfa.compile() if hasattr(dfa, 'compile') else dfa
+    encoded_alphabet = encode_alphabet(compiled_dfa.symbol_classes)
+    default_class = compiled_dfa.default_code
+    if default_class is None:
+        default_class = NO_DEFAULT_CLASS
+    flags = RULES_FLAG if compiled_dfa.acceptance_rules is not None else 0
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, compiled_dfa.state_count, compiled_dfa.symbol_count,
+                         compiled_dfa.initial_state, default_class, len(encoded_alphabet))
+    padding = -(len(header) + len(encoded_alphabet)) % ALIGNMENT
+
+    with open(path, 'wb') as file:
+        file.write(header)
+        file.write(encoded_alphabet)
+        file.write(b'\0' * padding)
+        file.write(int32_bytes(compiled_dfa.transitions))
+        file.write(bytes(compiled_dfa.acceptance))
+        if flags & RULES_FLAG:
+            file.write(b'\0' * (-compiled_dfa.state_count % ALIGNMENT))
+            file.write(int32_bytes(compiled_dfa.acceptance_rules))
+
+
+def load_dfa(path, use_mmap=True):
+    """
+    Loads a DFA saved with save_dfa. With mmap the table and acceptance map are read straight from the
+    (shared, read only) file pages, without parsing or copying them
+    :param path: file path
+    :param use_mmap: if the file is memory mapped
+    :return: compiled DFA
+    """
+    with open(path, 'rb') as file:
+        if use_mmap:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = file.read()
+
+    if len(buffer) < HEADER.size:
+        raise ValueError(f'{path} is not a compiled DFA file')
+    magic, version, flags, state_count, symbol_count, initial_state, default_class, alphabet_size = \
+        HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a compiled DFA file')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported compiled DFA format version {version} (expected {FORMAT_VERSION})')
+
+    symbol_classes = decode_alphabet(buffer, HEADER.size, symbol_count, default_class)
+    table_offset = HEADER.size + alphabet_size
+    table_offset += -table_offset % ALIGNMENT
+    item_size = array(TRANSITION_TYPECODE).itemsize
+    acceptance_offset = table_offset + state_count * symbol_count * item_size
+    rules_offset = acceptance_offset + state_count
+    rules_offset += -rules_offset % ALIGNMENT
+    file_end = rules_offset + state_count * item_size if flags & RULES_FLAG else acceptance_offset + state_count
+    if len(buffer) < file_end:
+        raise ValueError(f'{path} is truncated')
+
+    view = memoryview(buffer)
+    transitions = int32_view(view, table_offset, acceptance_offset)
+    acceptance = view[acceptance_offset:acceptance_offset + state_count]
+    acceptance_rules = None
+    if flags & RULES_FLAG:
+        acceptance_rules = int32_view(view, rules_offset, file_end)
+
+    compiled_dfa = CompiledDFA(symbol_classes, transitions, acceptance, initial_state, acceptance_rules)
+    # The mapping lives as long as the DFA
+    compiled_dfa.buffer = buffer
+    return compiled_dfa
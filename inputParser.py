@@ -4,6 +4,9 @@ Parses inputs for the Automaton program
 Pablo Ruiz 18259 (PingMaster99)
 """
 
+from alphabet import RegexSyntaxError
+from regexParser import parse_regex
+
 
 class InputParser(object):
     """
@@ -19,13 +22,16 @@ class InputParser(object):
         print(self.menu_text)
 
     @staticmethod
-    def capture_input(input_prompt):
+    def capture_input(input_prompt, lowercase=True):
         """
         Captures string user inputs
         :param input_prompt: input message
+        :param lowercase: if the input is converted to lowercase
         :return: user input
         """
-        user_input = input(input_prompt + '\n>>').lower()
+        user_input = input(input_prompt + '\n>>')
+        if lowercase:
+            user_input = user_input.lower()
         return user_input
 
     def capture_numeric_input(self, input_prompt, error_message, number_range_inclusive=None):
@@ -57,7 +63,7 @@ class InputParser(object):
         :return: regex input
         """
         while True:
-            user_input = self.capture_input(input_prompt)
+            user_input = self.capture_input(input_prompt, lowercase=False)
             valid, message = self.validate_regex(user_input)
             if valid:
                 return user_input
@@ -71,7 +77,7 @@ class InputParser(object):
         :return: simulation string
         """
         while True:
-            user_input = self.capture_input(input_prompt)
+            user_input = self.capture_input(input_prompt, lowercase=False)
             valid, message = self.validate_simulation_string(user_input)
             if valid:
                 return user_input
@@ -80,35 +86,22 @@ class InputParser(object):
 
     def validate_simulation_string(self, string):
         """
-        Validates a simulation string
+        Validates a simulation string (any character can be simulated)
         :param string: string to validate
         :return: if valid / message
         """
-        for character in string:
-            if character != 'a' and character != 'b':
-                return False, "Recuerde que debe introducir solo caracteres 'a' y 'b'"
         return True, ''
 
     def validate_regex(self, regex):
         """
-        Validates a regexp
+        Validates a regexp by parsing it. Operands are characters, '\\' escapes and classes ([a-z], [^ab]);
+        operators are '.', '|', '*', '+', '?' and bounded repetitions ({m}, {m,}, {m,n})
         :param regex: regular expression
         :return: if valid / message
         """
-        valid_characters = ['.', '+', '*', '|', 'a', 'b', '(', ')']
-        invalid_constructions = ['ab', 'ba', '*a', '*b', '+a', '+b', 'bb', 'aa', '..', '||']
-        character_index = 0
-
-        for character in regex:
-            if character not in valid_characters:
-                return False, f'Caracter inválido en la posición {character_index} de la expresión regular\nCaracteres válidos: {valid_characters}'
-            character_index += 1
-
-        if any(invalid_string in regex for invalid_string in invalid_constructions):
-            return False, 'Construcción inválida detectada, recuerde incluir puntos para la concatenación'
-
-        if regex.count('(') != regex.count(')'):
-            return False, 'La cuenta de paréntesis de apertura no es igual a la cuenta de paréntesis de cerradura'
-
+        try:
+            parse_regex(regex)
+        except RegexSyntaxError as error:
+            return False, f'{error.message} en la posición {error.position} de la expresión regular'
         return True, ''
 
@@ -0,0 +1,154 @@
+"""
+lazyDfa.py
+Lazy (on the fly) DFA over a Thompson NFA with a bounded state cache
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from compiledAutomaton import MatchingEngine, DEAD_STATE
+
+# Transition not computed yet
+UNKNOWN_STATE = -2
+DEFAULT_MAX_STATES = 10000
+DEFAULT_MAX_FLUSHES = 3
+
+
+class LazyDFA(MatchingEngine):
+    """
+    Builds DFA states (NFA state subsets) only when an input first reaches them. When the cache is
+    over its state budget it is flushed, and a match that keeps flushing falls back to NFA simulation
+    """
+
+    def __init__(self, automaton, max_states=DEFAULT_MAX_STATES, max_flushes=DEFAULT_MAX_FLUSHES):
+        self.simulation = automaton.bit_parallel()
+        self.symbol_classes = self.simulation.symbol_classes
+        self.symbol_codes = self.symbol_classes.class_of
+        self.symbol_count = self.symbol_classes.class_count
+        # Initial, current and next state must always fit after a flush
+        self.max_states = max(3, max_states)
+        self.max_flushes = max_flushes
+        self.flush_count = 0
+        self.fallback_count = 0
+        self.state_ids = {}
+        self.state_sets = []
+        self.transitions = []
+        self.acceptance = bytearray()
+        self.initial_state = None
+        self.flush()
+
+    def flush(self):
+        """
+        Empties the state cache (and the NFA closure cache it feeds from), only the initial state is kept
+        """
+        self.simulation.closure_cache.clear()
+        self.state_ids = {}
+        self.state_sets = []
+        self.transitions = []
+        self.acceptance = bytearray()
+        self.initial_state = self.get_state(self.simulation.initial_closure)
+
+    def get_state(self, bitset):
+        """
+        Gets the DFA state of an NFA state subset, creating it if it is not cached
+        :param bitset: NFA states bitset
+        :return: DFA state number
+        """
+        state = self.state_ids.get(bitset)
+        if state is None:
+            state = len(self.state_sets)
+            self.state_ids[bitset] = state
+            self.state_sets.append(bitset)
+            self.transitions.extend([UNKNOWN_STATE] * self.symbol_count)
+            self.acceptance.append(1 if bitset & self.simulation.acceptance_bitset else 0)
+        return state
+
+    @property
+    def state_count(self):
+        """
+        Number of cached DFA states
+        """
+        return len(self.state_sets)
+
+    def longest_match(self, string, start=0):
+        """
+        Finds the longest non-empty accepted prefix of string[start:]
+        :param string: input string
+        :param start: position where the match begins
+        :return: end position of the match, -1 if there is none
+        """
+        symbol_codes = self.symbol_codes
+        width = self.symbol_count
+        transitions = self.transitions
+        acceptance = self.acceptance
+        state = self.initial_state
+        last_acceptance = -1
+        flushes = 0
+
+        for position in range(start, len(string)):
+            code = symbol_codes[string[position]]
+            if code is None:
+                break
+            target = transitions[state * width + code]
+
+            if target == UNKNOWN_STATE:
+                next_set = self.simulation.step_class(self.state_sets[state], code)
+                if not next_set:
+                    target = DEAD_STATE
+                else:
+                    target = self.state_ids.get(next_set)
+                    if target is None:
+                        if len(self.state_sets) >= self.max_states:
+                            current_set = self.state_sets[state]
+                            self.flush()
+                            self.flush_count += 1
+                            flushes += 1
+                            if flushes > self.max_flushes:
+                                self.fallback_count += 1
+                                return self.simulate_from(string, position, current_set, last_acceptance)
+                            transitions = self.transitions
+                            acceptance = self.acceptance
+                            state = self.get_state(current_set)
+                        target = self.get_state(next_set)
+                transitions[state * width + code] = target
+
+            if target == DEAD_STATE:
+                break
+            state = target
+            if acceptance[state]:
+                last_acceptance = position + 1
+        return last_acceptance
+
+    def simulate_from(self, string, position, current_set, last_acceptance):
+        """
+        Finishes a match with plain NFA simulation (used when the cache thrashes)
+        :param string: input string
+        :param position: position of the next character
+        :param current_set: active NFA states bitset
+        :param last_acceptance: end of the last accepted prefix so far
+        :return: end position of the match, -1 if there is none
+        """
+        simulation = self.simulation
+        acceptance_bitset = simulation.acceptance_bitset
+        for position in range(position, len(string)):
+            current_set = simulation.step(current_set, string[position])
+            if not current_set:
+                break
+            if current_set & acceptance_bitset:
+                last_acceptance = position + 1
+        return last_acceptance
+
+    def accepts(self, string):
+        """
+        Checks if the whole string belongs to the language
+        :param string: input string
+        :return: True if accepted
+        """
+        if len(string) == 0:
+            return self.accepts_empty()
+        return self.longest_match(string) == len(string)
+
+    def accepts_empty(self):
+        """
+        Checks if the empty string is accepted
+        :return: True if the initial state is an acceptance state
+        """
+        return bool(self.acceptance[self.initial_state])
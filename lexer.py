@@ -0,0 +1,95 @@
+"""
+lexer.py
+Multi-rule lexer compiled into a single prioritized DFA
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from array import array
+from automaton import AutomatonGeneration
+from compiledAutomaton import MatchingEngine, TokenizationError, TRANSITION_TYPECODE
+from dataStructures import bitset_indexes
+from compactNfa import indexes_to_bitset
+
+
+class Lexer(MatchingEngine):
+    """
+    Tokenizes with several (rule name, regex) rules in one pass. The rule NFAs share an initial state,
+    and every accepting DFA state is tagged with its highest priority rule (the first one in the list)
+    """
+
+    def __init__(self, rules, minimize=True):
+        self.rules = list(rules)
+        self.rule_names = [name for name, _ in self.rules]
+        automaton_generator = AutomatonGeneration()
+        rules_nfa, rule_acceptance_states = automaton_generator.generate_rules_nfa(self.rules)
+        self.dfa = self.build_table(automaton_generator, rules_nfa, rule_acceptance_states)
+        if minimize:
+            self.dfa = self.dfa.minimized()
+
+    @staticmethod
+    def build_table(automaton_generator, rules_nfa, rule_acceptance_states):
+        """
+        Builds the subset DFA of the joined rules and tags its states with rules
+        :param automaton_generator: automaton generator
+        :param rules_nfa: joined NFA
+        :param rule_acceptance_states: acceptance state number of each rule
+        :return: compiled DFA with acceptance_rules
+        """
+        compiled_dfa, dfa_states = automaton_generator.subset_construction(rules_nfa)
+        rule_of_state = {}
+        for rule, state in enumerate(rule_acceptance_states):
+            rule_of_state.setdefault(state, rule)
+        acceptance_bitset = indexes_to_bitset(rule_acceptance_states, rules_nfa.state_count)
+
+        acceptance_rules = array(TRANSITION_TYPECODE, [-1]) * len(dfa_states)
+        for dfa_state, subset in enumerate(dfa_states):
+            accepted = subset & acceptance_bitset
+            if accepted:
+                acceptance_rules[dfa_state] = min(rule_of_state[index] for index in bitset_indexes(accepted))
+        compiled_dfa.acceptance_rules = acceptance_rules
+        return compiled_dfa
+
+    def longest_match(self, string, start=0):
+        """
+        Finds the longest non-empty prefix of string[start:] accepted by any rule
+        :param string: input string
+        :param start: position where the match begins
+        :return: end position of the match, -1 if there is none
+        """
+        return self.dfa.longest_match(string, start)
+
+    def accepts_empty(self):
+        """
+        Checks if some rule accepts the empty string
+        :return: True if the initial state accepts
+        """
+        return self.dfa.accepts_empty()
+
+    def iter_tokens(self, string, start=0):
+        """
+        Lazily splits a string in typed tokens (longest match, ties go to the first rule)
+        :param string: string to tokenize
+        :param start: position where tokenization begins
+        :return: generator with (rule name, start, end)
+        :raises TokenizationError: when no rule matches at a position
+        """
+        rule_names = self.rule_names
+        longest_rule_match = self.dfa.longest_rule_match
+        position = start
+        length = len(string)
+
+        while position < length:
+            end, rule = longest_rule_match(string, position)
+            if end < 0:
+                raise TokenizationError(position)
+            yield rule_names[rule], position, end
+            position = end
+
+    def tokenize(self, string):
+        """
+        Splits a string in typed tokens
+        :param string: string to tokenize
+        :return: list with (rule name, start, end)
+        :raises TokenizationError: when no rule matches at a position
+        """
+        return list(self.iter_tokens(string))
@@ -0,0 +1,304 @@
+"""
+literalPrefilter.py
+Literal factors that every match of a regex contains, used to skip ahead with str.find in unanchored searches
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from alphabet import CharacterClass
+
+
+class LiteralFacts(object):
+    """
+    Literals known about the matches of a syntax tree node. Offsets are the most characters a match can
+    have before the literal, None when they are unbounded
+    """
+
+    def __init__(self, exact, prefix, suffix, factors, max_length):
+        # The only string the node matches, None if it matches several
+        self.exact = exact
+        # Every match starts with prefix and ends with suffix
+        self.prefix = prefix
+        self.suffix = suffix
+        # Literals every match contains as (literal, offset): the best one with a bounded offset and the
+        # longest one (they can be the same)
+        self.factors = factors
+        # Longest match, None if unbounded
+        self.max_length = max_length
+
+    @classmethod
+    def from_exact(cls, exact):
+        """
+        Facts of a node that matches a single string
+        :param exact: the string
+        :return: literal facts
+        """
+        return cls(exact, exact, exact, best_factors([(exact, 0)]), len(exact))
+
+
+def add_lengths(first, second):
+    """
+    Adds lengths or offsets that can be unbounded
+    :param first: int or None
+    :param second: int or None
+    :return: sum, None if any is None
+    """
+    if first is None or second is None:
+        return None
+    return first + second
+
+
+def best_factors(candidates):
+    """
+    Chooses the factors kept for a node among the literals its matches are known to contain
+    :param candidates: list of (literal, offset)
+    :return: (best bounded factor, longest factor), ('', 0) when there is none
+    """
+    bounded = ('', 0)
+    longest = ('', 0)
+    for literal, offset in candidates:
+        if offset is not None and (len(literal), -offset) > (len(bounded[0]), -bounded[1]):
+            bounded = (literal, offset)
+        if len(literal) > len(longest[0]) or (len(literal) == len(longest[0]) and longest[1] is None):
+            longest = (literal, offset)
+    return bounded, longest
+
+
+def common_prefix(literals):
+    """
+    Longest common prefix of some literals
+    :param literals: list of strings
+    :return: common prefix
+    """
+    first, last = min(literals), max(literals)
+    size = 0
+    while size < len(first) and first[size] == last[size]:
+        size += 1
+    return first[:size]
+
+
+def common_suffix(literals):
+    """
+    Longest common suffix of some literals
+    :param literals: list of strings
+    :return: common suffix
+    """
+    return common_prefix([literal[::-1] for literal in literals])[::-1]
+
+
+def suffix_factor(suffix, max_length):
+    """
+    A suffix as a factor: it ends the match, so its offset is bounded by the longest match
+    :param suffix: literal every match ends with
+    :param max_length: longest match, None if unbounded
+    :return: (literal, offset)
+    """
+    return suffix, add_lengths(max_length, -len(suffix))
+
+
+def operand_facts(operand):
+    """
+    Facts of a leaf
+    :param operand: CharacterClass or ε
+    :return: literal facts
+    """
+    if isinstance(operand, CharacterClass):
+        character = operand.single_character()
+        if character is not None:
+            return LiteralFacts.from_exact(character)
+        return LiteralFacts(None, '', '', best_factors([]), 1)
+    return LiteralFacts.from_exact('')
+
+
+def concatenation_facts(children):
+    """
+    Facts of a concatenation: exact children are joined with the literals around them
+    :param children: literal facts of the factors
+    :return: literal facts
+    """
+    if all(child.exact is not None for child in children):
+        return LiteralFacts.from_exact(''.join(child.exact for child in children))
+
+    prefix = ''
+    for child in children:
+        if child.exact is None:
+            prefix += child.prefix
+            break
+        prefix += child.exact
+    suffix = ''
+    for child in reversed(children):
+        if child.exact is None:
+            suffix = child.suffix + suffix
+            break
+        suffix = child.exact + suffix
+
+    # The literal that ends at the current boundary grows over exact children and spans into the next prefix
+    candidates = []
+    boundary_literal, boundary_offset = '', 0
+    length_before = 0
+    for child in children:
+        for literal, offset in child.factors:
+            candidates.append((literal, add_lengths(length_before, offset)))
+        candidates.append((boundary_literal + child.prefix, boundary_offset))
+        if child.exact is not None:
+            boundary_literal += child.exact
+        else:
+            boundary_literal, offset = suffix_factor(child.suffix, child.max_length)
+            boundary_offset = add_lengths(length_before, offset)
+        length_before = add_lengths(length_before, child.max_length)
+    candidates.append(suffix_factor(suffix, length_before))
+
+    return LiteralFacts(None, prefix, suffix, best_factors(candidates), length_before)
+
+
+def alternation_facts(children):
+    """
+    Facts of an alternation: only what every option shares
+    :param children: literal facts of the options
+    :return: literal facts
+    """
+    exact_strings = {child.exact for child in children}
+    if len(exact_strings) == 1 and None not in exact_strings:
+        return LiteralFacts.from_exact(exact_strings.pop())
+
+    max_length = 0
+    for child in children:
+        max_length = None if child.max_length is None or max_length is None else max(max_length, child.max_length)
+    prefix = common_prefix([child.prefix for child in children])
+    suffix = common_suffix([child.suffix for child in children])
+    candidates = [(prefix, 0), suffix_factor(suffix, max_length)]
+
+    # A factor of some option that every option contains (inside one of its factors), at its worst offset
+    for literal in dict.fromkeys(literal for child in children for literal, _ in child.factors if literal):
+        offset = 0
+        for child in children:
+            offsets = [add_lengths(factor_offset, factor.find(literal)) for factor, factor_offset in child.factors
+                       if literal in factor]
+            if not offsets:
+                break
+            bounded_offsets = [factor_offset for factor_offset in offsets if factor_offset is not None]
+            offset = None if offset is None or not bounded_offsets else max(offset, min(bounded_offsets))
+        else:
+            candidates.append((literal, offset))
+
+    return LiteralFacts(None, prefix, suffix, best_factors(candidates), max_length)
+
+
+def repetition_facts(child, minimum, maximum):
+    """
+    Facts of a repetition, only the required copies contribute literals
+    :param child: literal facts of the repeated node
+    :param minimum: required copies
+    :param maximum: most copies, None if unbounded
+    :return: literal facts
+    """
+    max_length = None if maximum is None or child.max_length is None else maximum * child.max_length
+    if minimum == 0:
+        return LiteralFacts(None, '', '', best_factors([]), max_length)
+    if child.exact is not None:
+        required = child.exact * minimum
+        if minimum == maximum:
+            return LiteralFacts.from_exact(required)
+        return LiteralFacts(None, required, required, best_factors([(required, 0)]), max_length)
+    return LiteralFacts(None, child.prefix, child.suffix, child.factors, max_length)
+
+
+def literal_facts(tree):
+    """
+    Computes the literal facts of a syntax tree, bottom-up without recursion (nodes are shared, each one is
+    visited once)
+    :param tree: root RegexNode
+    :return: literal facts of the root
+    """
+    facts = {}
+    pending = [tree]
+    while pending:
+        node = pending[-1]
+        if node.number in facts:
+            pending.pop()
+            continue
+        missing = [child for child in node.children if child.number not in facts]
+        if missing:
+            pending.extend(missing)
+            continue
+        pending.pop()
+
+        children = [facts[child.number] for child in node.children]
+        if node.operator is None:
+            node_facts = operand_facts(node.operand)
+        elif node.operator == '.':
+            node_facts = concatenation_facts(children)
+        elif node.operator == '|':
+            node_facts = alternation_facts(children)
+        elif node.operator == '*':
+            node_facts = repetition_facts(children[0], 0, None)
+        elif node.operator == '+':
+            node_facts = repetition_facts(children[0], 1, None)
+        else:
+            node_facts = repetition_facts(children[0], node.operator.minimum, node.operator.maximum)
+        facts[node.number] = node_facts
+    return facts[tree.number]
+
+
+class LiteralPrefilter(object):
+    """
+    Finds the positions where a match can start from literals every match contains: an anchor literal at a
+    bounded offset from the start of the match, and an optional longer required literal at any offset.
+    Positions far from the next occurrence are skipped with str.find instead of running the automaton
+    """
+
+    def __init__(self, anchor, max_offset, required=''):
+        # Anchor literal ('' if there is none) and the most characters a match has before it
+        self.anchor = anchor
+        self.max_offset = max_offset
+        # Literal every match contains somewhere ('' if the anchor is enough)
+        self.required = required
+
+    @classmethod
+    def from_tree(cls, tree):
+        """
+        Builds the prefilter of a regex syntax tree
+        :param tree: root RegexNode
+        :return: prefilter, None if no literal is known
+        """
+        (anchor, max_offset), (required, _) = literal_facts(tree).factors
+        if len(required) <= len(anchor):
+            required = ''
+        if anchor == '' and required == '':
+            return None
+        return cls(anchor, max_offset, required)
+
+    def candidates(self, string, start=0):
+        """
+        Positions where a match can start, in increasing order
+        :param string: input string
+        :param start: first position
+        :return: generator with positions
+        """
+        anchor, max_offset, required = self.anchor, self.max_offset, self.required
+        find = string.find
+        position = start
+        length = len(string)
+        # Next occurrence of the required literal, searched again once the position passes it
+        required_index = -1
+
+        while position < length:
+            if required and required_index < position:
+                required_index = find(required, position)
+                if required_index < 0:
+                    return
+            if anchor:
+                anchor_index = find(anchor, position)
+                if anchor_index < 0:
+                    return
+                # A match that contains this occurrence starts at most max_offset characters before it
+                first = max(position, anchor_index - max_offset)
+                last = anchor_index + 1
+            else:
+                # Matches starting up to the occurrence can contain it, later ones need a later occurrence
+                first, last = position, required_index + 1
+            for candidate in range(first, last):
+                yield candidate
+            position = last
+
+    def __str__(self):
+        return f'anchor={self.anchor!r} (offset <= {self.max_offset}) required={self.required!r}'
@@ -2,10 +2,24 @@
 main.py
 Main file for the Automaton program
 Pablo Ruiz 18259 (PingMaster99)
+
+Usage: python main.py (interactive menu)
+       python main.py [--stats] {compile,export,match,search,tokenize} ... (headless, see --help)
+       python main.py serve [--port 8765 | --socket path] (tokenization service, see tokenizationServer.py)
 """
 
-from automaton import AutomatonGeneration
+import argparse
+import json
+import sys
+from contextlib import nullcontext
+from automatonCache import compile_regex, THOMPSON_NFA, SUBSET_DFA, DIRECT_DFA, CONSTRUCTION_METHODS
+from automaton import StateBudgetError
+from automatonStats import AutomatonStats
+from compiledAutomaton import TokenizationError
+from dfaSerialization import save_dfa, load_dfa
+from automatonExport import export_automaton
 from inputParser import InputParser
+from streamTokenizer import StreamTokenizer, DEFAULT_CHUNK_SIZE
 
 MENU = """
 --------------------------
@@ -17,10 +31,11 @@ Seleccione una opción:
 3. Construir un AFD por una expresión regular
 4. Simular un AFN
 5. Simular un AFD
-6. Salir
+6. Mostrar estadísticas
+7. Salir
 """
 input_parser = InputParser(MENU)
-automaton_generator = AutomatonGeneration()
+statistics = AutomatonStats()
 
 
 def match_automaton(automaton):
@@ -31,6 +46,14 @@ def match_automaton(automaton):
         print(token)
 
 
+def build_automaton(regex, method):
+    try:
+        return compile_regex(regex, method, stats=statistics)
+    except StateBudgetError as error:
+        print(f"Vaya! El autómata supera el límite de {error.max_states} estados, simplifique la expresión regular")
+        return None
+
+
 def print_automaton_generation():
     print("""
 Se ha generado el autómata de forma exitosa! 
@@ -49,11 +72,13 @@ def main():
     while True:
         input_parser.print_menu()
         selected_option = input_parser.capture_numeric_input("Introduzca la opción a realizar",
-                                                             "ERROR: Introduzca un número del 1 al 6\n")
+                                                             "ERROR: Introduzca un número del 1 al 7\n")
         if selected_option == 1:
             regex = input_parser.capture_regex_input("Introduzca la expresión regular para el AFN a generar")
-            thompson_regex = regex
-            thompson_nfa = automaton_generator.generate_thompson_nfa(regex)
+            nfa = build_automaton(regex, THOMPSON_NFA)
+            if nfa is None:
+                continue
+            thompson_regex, thompson_nfa = regex, nfa
             print_automaton_generation()
             thompson_nfa.display()
         elif selected_option == 2:
@@ -62,13 +87,17 @@ def main():
                 continue
             else:
                 print(f"Generando AFD con el AFN ({thompson_regex}) guardado")
-                subset_dfa = automaton_generator.convert_to_dfa(thompson_nfa)
+                subset_dfa = build_automaton(thompson_regex, SUBSET_DFA)
+                if subset_dfa is None:
+                    continue
                 print_automaton_generation()
                 subset_dfa.display()
         elif selected_option == 3:
             regex = input_parser.capture_regex_input("Introduzca la expresión regular para el AFN a generar")
-            regex_dfa_regex = regex
-            regex_dfa = automaton_generator.direct_dfa_construction(regex)
+            dfa = build_automaton(regex, DIRECT_DFA)
+            if dfa is None:
+                continue
+            regex_dfa_regex, regex_dfa = regex, dfa
             print_automaton_generation()
             regex_dfa.display()
 
@@ -97,9 +126,224 @@ def main():
                 if input_parser.capture_input("Introduzca '1' si desea utilizar este autómata") == '1':
                     match_automaton(regex_dfa)
         elif selected_option == 6:
+            if len(statistics.timings) == 0 and len(statistics.counters) == 0:
+                print("Aún no hay estadísticas, construya o simule un autómata primero")
+            else:
+                print(f"Estadísticas de construcción y simulación:\n{statistics.report()}")
+        elif selected_option == 7:
             print("Gracias por haber utilizado el programa de autómatas, que tenga un feliz día!")
             break
 
 
+def build_argument_parser():
+    """
+    Builds the parser of the non-interactive commands
+    :return: argument parser
+    """
+    parser = argparse.ArgumentParser(description='Programa de autómatas. Sin argumentos se abre el menú interactivo')
+    parser.add_argument('--stats', action='store_true', help='escribe las estadísticas en stderr al finalizar')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = subparsers.add_parser('compile', help='compila una expresión regular a un archivo de AFD')
+    compile_parser.add_argument('regex', help='expresión regular')
+    compile_parser.add_argument('output', help='archivo de AFD a escribir')
+    compile_parser.add_argument('--method', choices=(SUBSET_DFA, DIRECT_DFA), default=SUBSET_DFA)
+    compile_parser.add_argument('--minimize', action='store_true', help='minimiza el AFD')
+
+    export_parser = subparsers.add_parser('export', help='exporta el autómata a .dot, .graphml o una imagen')
+    export_parser.add_argument('regex', nargs='?', help='expresión regular')
+    export_parser.add_argument('output', help='archivo a escribir, el formato depende de la extensión')
+    export_parser.add_argument('--dfa', help='archivo de AFD generado con compile (en lugar de la expresión)')
+    export_parser.add_argument('--method', choices=CONSTRUCTION_METHODS, default=SUBSET_DFA)
+    export_parser.add_argument('--minimize', action='store_true', help='minimiza el AFD')
+
+    match_parser = subparsers.add_parser('match', help='evalúa cada línea de la entrada')
+    search_parser = subparsers.add_parser('search', help='busca las coincidencias dentro de cada línea')
+    tokenize_parser = subparsers.add_parser('tokenize', help='separa toda la entrada en tokens')
+    tokenize_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                                 help='caracteres leídos a la vez')
+    for command_parser in (match_parser, search_parser, tokenize_parser):
+        command_parser.add_argument('regex', nargs='?', help='expresión regular')
+        command_parser.add_argument('--dfa', help='archivo de AFD generado con compile (en lugar de la expresión)')
+        command_parser.add_argument('--method', choices=CONSTRUCTION_METHODS, default=SUBSET_DFA)
+        command_parser.add_argument('--minimize', action='store_true', help='minimiza el AFD')
+        command_parser.add_argument('--input', default='-', help='archivo de entrada (- para stdin)')
+
+    serve_parser = subparsers.add_parser('serve', help='servicio de tokenización (JSON por líneas)')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--socket', help='socket Unix (en lugar de TCP)')
+    serve_parser.add_argument('--method', choices=CONSTRUCTION_METHODS, default=SUBSET_DFA)
+    serve_parser.add_argument('--minimize', action='store_true', help='minimiza el AFD')
+    serve_parser.add_argument('--batch-size', type=int, default=256, help='solicitudes por lote como máximo')
+    serve_parser.add_argument('--batch-delay', type=float, default=2.0,
+                              help='espera máxima en ms antes de procesar un lote')
+    serve_parser.add_argument('--max-pending', type=int, default=1024,
+                              help='solicitudes en proceso antes de dejar de leer')
+    return parser
+
+
+def command_automaton(arguments, statistics):
+    """
+    Gets the automaton of a command, from its regex or from a compiled DFA file
+    :param arguments: parsed arguments
+    :param statistics: AutomatonStats or None
+    :return: automaton or compiled DFA
+    """
+    if getattr(arguments, 'dfa', None) is not None:
+        return load_dfa(arguments.dfa)
+    valid, message = input_parser.validate_regex(arguments.regex)
+    if not valid:
+        raise ValueError(message)
+    return compile_regex(arguments.regex, arguments.method, arguments.minimize, statistics)
+
+
+def open_input(path):
+    """
+    Opens the input of a command
+    :param path: file path, - for stdin
+    :return: context manager with the text file object (stdin is left open)
+    """
+    if path == '-':
+        return nullcontext(sys.stdin)
+    return open(path, encoding='utf-8')
+
+
+def match_lines(automaton, input_file, output_file):
+    """
+    Matches every line and writes one JSON result per line
+    :param automaton: automaton or compiled DFA
+    :param input_file: text input
+    :param output_file: text output
+    :return: True if every line was valid
+    """
+    all_valid = True
+    for line in input_file:
+        line = line.rstrip('\r\n')
+        valid, tokens = automaton.match_tokens(line)
+        all_valid = all_valid and valid
+        output_file.write(json.dumps({'input': line, 'valid': valid, 'tokens': tokens}, ensure_ascii=False) + '\n')
+    return all_valid
+
+
+def search_lines(automaton, input_file, output_file):
+    """
+    Finds the matches inside every line and writes one JSON result per match
+    :param automaton: automaton or compiled DFA
+    :param input_file: text input
+    :param output_file: text output
+    :return: True if some line had a match
+    """
+    found = False
+    for line_number, line in enumerate(input_file, 1):
+        line = line.rstrip('\r\n')
+        for start, end in automaton.finditer(line):
+            found = True
+            output_file.write(json.dumps({'line': line_number, 'start': start, 'end': end, 'match': line[start:end]},
+                                         ensure_ascii=False) + '\n')
+    return found
+
+
+def tokenize_stream(automaton, input_file, output_file, chunk_size):
+    """
+    Tokenizes the whole input in chunks and writes one JSON token per line as soon as it is final
+    :param automaton: automaton or compiled DFA
+    :param input_file: text input
+    :param output_file: text output
+    :param chunk_size: characters read at a time
+    :raises TokenizationError: when no token matches at a position
+    """
+    stream_tokenizer = StreamTokenizer(automaton)
+    try:
+        for chunk in iter(lambda: input_file.read(chunk_size), ''):
+            write_tokens(stream_tokenizer.feed(chunk), output_file)
+        write_tokens(stream_tokenizer.close(), output_file)
+    except TokenizationError as error:
+        # Tokens found before the error in the same chunk are still written
+        write_tokens(error.tokens, output_file)
+        raise
+
+
+def write_tokens(tokens, output_file):
+    """
+    Writes tokens as JSON lines
+    :param tokens: list of (rule name, start, end, text)
+    :param output_file: text output
+    """
+    for _, start, end, text in tokens:
+        output_file.write(json.dumps({'start': start, 'end': end, 'token': text}, ensure_ascii=False) + '\n')
+
+
+def run_server(arguments):
+    """
+    Runs the tokenization server until it is interrupted
+    :param arguments: parsed arguments
+    :return: exit code (0 ok, 2 if the address can not be used)
+    """
+    # Imported here so the other commands do not pay for asyncio at startup
+    import asyncio
+    from tokenizationServer import serve
+
+    def print_address(server):
+        print(f"Servicio de tokenización escuchando en {server.address()}", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.socket, print_address, method=arguments.method,
+                          minimize=arguments.minimize, max_batch_size=arguments.batch_size,
+                          batch_delay=arguments.batch_delay / 1000, max_pending=arguments.max_pending))
+    except KeyboardInterrupt:
+        pass
+    except OSError as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def run_command(command_arguments):
+    """
+    Runs a non-interactive command
+    :param command_arguments: command line arguments
+    :return: exit code (0 ok, 1 invalid input or nothing found, 2 invalid regex or file)
+    """
+    arguments = build_argument_parser().parse_args(command_arguments)
+    if arguments.command == 'serve':
+        return run_server(arguments)
+    statistics = AutomatonStats() if arguments.stats else None
+    if arguments.command != 'compile' and (arguments.regex is None) == (arguments.dfa is None):
+        print("ERROR: indique una expresión regular o un archivo --dfa", file=sys.stderr)
+        return 2
+
+    try:
+        automaton = command_automaton(arguments, statistics)
+        if arguments.command == 'compile':
+            save_dfa(automaton, arguments.output)
+            exit_code = 0
+        elif arguments.command == 'export':
+            export_automaton(automaton, arguments.output)
+            exit_code = 0
+        else:
+            with open_input(arguments.input) as input_file:
+                if arguments.command == 'match':
+                    exit_code = 0 if match_lines(automaton, input_file, sys.stdout) else 1
+                elif arguments.command == 'search':
+                    exit_code = 0 if search_lines(automaton, input_file, sys.stdout) else 1
+                else:
+                    tokenize_stream(automaton, input_file, sys.stdout, arguments.chunk_size)
+                    exit_code = 0
+    except TokenizationError as error:
+        sys.stdout.flush()
+        print(f"ERROR: ningún token coincide en la posición {error.position}", file=sys.stderr)
+        exit_code = 1
+    except (ValueError, OSError, ImportError) as error:
+        print(f"ERROR: {error}", file=sys.stderr)
+        return 2
+
+    if statistics is not None:
+        print(statistics.report(), file=sys.stderr)
+    return exit_code
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     main()
@@ -0,0 +1,146 @@
+"""
+nfaSimulation.py
+Bit-parallel simulation of Thompson NFAs
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from copy import copy
+from compiledAutomaton import MatchingEngine
+from dataStructures import bitset_indexes
+from compactNfa import indexes_to_bitset, EPSILON_SYMBOL
+
+
+class BitParallelNFA(MatchingEngine):
+    """
+    Simulates an NFA keeping the active states as a single integer bitset
+    """
+
+    def __init__(self, automaton):
+        self.automaton = automaton
+        compact = automaton.compact_nfa()
+        self.closure_cache = automaton.closure_cache
+        self.initial_closure = automaton.state_closure(compact.initial_state)
+        self.acceptance_bitset = compact.acceptance_bitset()
+
+        self.symbol_classes = automaton.symbol_classes()
+        self.symbol_codes = self.symbol_classes.class_of
+
+        # Per symbol class bitset with the states that have a transition with that class
+        class_codes = [self.symbol_classes.codes_in(character_class) for character_class in compact.character_classes]
+        class_states = [[] for _ in range(self.symbol_classes.class_count)]
+        symbols = compact.symbols
+        self.transition_targets = compact.edge1
+        # Thompson literals always go from state k to k + 1, so a move is a single shift
+        self.shift_moves = True
+        for index in range(compact.state_count):
+            symbol = symbols[index]
+            if symbol == EPSILON_SYMBOL:
+                continue
+            for code in class_codes[symbol]:
+                class_states[code].append(index)
+            if self.transition_targets[index] != index + 1:
+                self.shift_moves = False
+        self.class_masks = [indexes_to_bitset(states, compact.state_count) for states in class_states]
+
+    def bind(self, automaton):
+        """
+        Copy of the engine that computes closures through another view of the same NFA
+        :param automaton: automaton sharing the compact NFA and closure cache of this engine
+        :return: bound engine (the masks and tables are shared)
+        """
+        engine = copy(self)
+        engine.automaton = automaton
+        return engine
+
+    def move(self, active_states):
+        """
+        Moves every active state through its symbol transition
+        :param active_states: bitset of states already filtered by the symbol mask
+        :return: bitset with the targets
+        """
+        if self.shift_moves:
+            return active_states << 1
+        transition_targets = self.transition_targets
+        moved = 0
+        for index in bitset_indexes(active_states):
+            moved |= 1 << transition_targets[index]
+        return moved
+
+    def step(self, current, symbol):
+        """
+        Advances the active state bitset with a symbol
+        :param current: active states bitset
+        :param symbol: input symbol
+        :return: next active states bitset (0 when every state died)
+        """
+        code = self.symbol_codes[symbol]
+        if code is None:
+            return 0
+        return self.step_class(current, code)
+
+    def step_class(self, current, code):
+        """
+        Advances the active state bitset with a symbol class
+        :param current: active states bitset
+        :param code: symbol class code
+        :return: next active states bitset (0 when every state died)
+        """
+        moved = self.move(current & self.class_masks[code])
+        closure = self.closure_cache.get(moved)
+        if closure is None:
+            closure = self.automaton.closure_of_bitset(moved)
+        return closure
+
+    def longest_match(self, string, start=0):
+        """
+        Finds the longest non-empty accepted prefix of string[start:]
+        :param string: input string
+        :param start: position where the match begins
+        :return: end position of the match, -1 if there is none
+        """
+        symbol_codes = self.symbol_codes
+        class_masks = self.class_masks
+        closure_cache = self.closure_cache
+        closure_of_bitset = self.automaton.closure_of_bitset
+        acceptance_bitset = self.acceptance_bitset
+        shift_moves = self.shift_moves
+        current = self.initial_closure
+        last_acceptance = -1
+
+        for position in range(start, len(string)):
+            code = symbol_codes[string[position]]
+            if code is None:
+                break
+            symbol_mask = class_masks[code]
+            if shift_moves:
+                moved = (current & symbol_mask) << 1
+            else:
+                moved = self.move(current & symbol_mask)
+            current = closure_cache.get(moved)
+            if current is None:
+                current = closure_of_bitset(moved)
+            if not current:
+                break
+            if current & acceptance_bitset:
+                last_acceptance = position + 1
+        return last_acceptance
+
+    def accepts(self, string):
+        """
+        Checks if the whole string belongs to the language
+        :param string: input string
+        :return: True if accepted
+        """
+        current = self.initial_closure
+        for character in string:
+            current = self.step(current, character)
+            if not current:
+                return False
+        return bool(current & self.acceptance_bitset)
+
+    def accepts_empty(self):
+        """
+        Checks if the empty string is accepted
+        :return: True if the initial closure contains an acceptance state
+        """
+        return bool(self.initial_closure & self.acceptance_bitset)
@@ -0,0 +1,398 @@
+"""
+parallelMatching.py
+Data-parallel matching of one large input: a process pool scans chunks speculatively and a sequential
+pass stitches their results, which are the same as the ones of the sequential engine
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+import os
+import batchMatching
+from array import array
+from bisect import bisect_left
+from itertools import chain
+from compiledAutomaton import MatchingEngine, TokenizationError, DEAD_STATE
+
+DEFAULT_PARALLEL_CHUNK_SIZE = 1 << 22
+# Characters before a chunk that narrow down the states the automaton can be in when the chunk starts
+DEFAULT_LOOKBACK = 256
+# Chunks with more possible entry states do not get a state map, tokens that reach them are run sequentially
+DEFAULT_MAX_ENTRY_STATES = 256
+# Token positions are 64 bit, inputs can be longer than 2^31 characters
+POSITION_TYPECODE = 'q'
+
+
+class ChunkSummary(object):
+    """
+    Result of scanning the chunk [start, end) of the input
+    """
+
+    def __init__(self, start, end, entries, token_starts, pending_state, pending_acceptance):
+        self.start = start
+        self.end = end
+        # State map of the chunk: entry state -> (state at the end, DEAD_STATE if it died; end of the last
+        # acceptance in the chunk, -1 if none). None when the entry states did not converge
+        self.entries = entries
+        # Speculative tokenization assuming a token starts at start: token starts, the last one is end, an
+        # error position or the start of a token that continues into the next chunk (pending state set)
+        self.token_starts = token_starts
+        self.pending_state = pending_state
+        self.pending_acceptance = pending_acceptance
+
+
+def advance(dfa, text, offset, state, last_acceptance, start, end):
+    """
+    Runs a DFA over the positions [start, end) of the input until it dies
+    :param dfa: compiled DFA
+    :param text: part of the input that begins at offset
+    :param offset: input position of text[0]
+    :param state: current state
+    :param last_acceptance: end of the last acceptance so far, -1 if none
+    :param start: first input position
+    :param end: input position where the run stops
+    :return: (state at end, DEAD_STATE if it died; end of the last acceptance)
+    """
+    transitions = dfa.transitions
+    acceptance = dfa.acceptance
+    symbol_codes = dfa.symbol_codes
+    width = dfa.symbol_count
+
+    for index in range(start - offset, end - offset):
+        code = symbol_codes[text[index]]
+        if code is None:
+            return DEAD_STATE, last_acceptance
+        state = transitions[state * width + code]
+        if state < 0:
+            return DEAD_STATE, last_acceptance
+        if acceptance[state]:
+            last_acceptance = index + offset + 1
+    return state, last_acceptance
+
+
+def entry_states(dfa, text, offset, start, exact, max_entry_states):
+    """
+    Finds the states a run can be in at start: every state at the beginning of the lookback text[:start - offset]
+    moved over it, with a token restarting at any of its positions
+    :param dfa: compiled DFA
+    :param text: part of the input that begins at offset
+    :param offset: input position where the lookback begins
+    :param start: chunk start
+    :param exact: if the lookback begins where matching begins (only the initial state is possible there)
+    :param max_entry_states: most states kept
+    :return: set of states, None if there are more than max_entry_states
+    """
+    transitions = dfa.transitions
+    symbol_codes = dfa.symbol_codes
+    width = dfa.symbol_count
+    initial_state = dfa.initial_state
+
+    states = {initial_state} if exact else set(range(dfa.state_count))
+    for index in range(start - offset):
+        states.add(initial_state)
+        code = symbol_codes[text[index]]
+        if code is None:
+            states = set()
+            continue
+        states = {transitions[state * width + code] for state in states}
+        states.discard(DEAD_STATE)
+    states.add(initial_state)
+    return states if len(states) <= max_entry_states else None
+
+
+def run_entries(dfa, text, offset, start, end, states):
+    """
+    Runs a chunk from each entry state. Runs that reach the same state are merged, so the work shrinks as
+    they converge, and a single remaining run continues as a plain DFA run
+    :param dfa: compiled DFA
+    :param text: part of the input that begins at offset
+    :param offset: input position of text[0]
+    :param start: chunk start
+    :param end: chunk end
+    :param states: entry states
+    :return: dictionary entry state -> (state at end, DEAD_STATE if it died; end of the last acceptance, -1)
+    """
+    transitions = dfa.transitions
+    acceptance = dfa.acceptance
+    symbol_codes = dfa.symbol_codes
+    width = dfa.symbol_count
+
+    entries = {}
+    # Current state -> list of [entry states, end of their last acceptance]
+    live = {state: [[[state], -1]] for state in states}
+    index = start - offset
+    stop = end - offset
+    while live and index < stop:
+        if len(live) == 1:
+            (state, records), = live.items()
+            if len(records) == 1:
+                origins, last_acceptance = records[0]
+                live = {}
+                state, last_acceptance = advance(dfa, text, offset, state, last_acceptance, index + offset, end)
+                for origin in origins:
+                    entries[origin] = (state, last_acceptance)
+                break
+
+        code = symbol_codes[text[index]]
+        next_live = {}
+        for state, records in live.items():
+            target = DEAD_STATE if code is None else transitions[state * width + code]
+            if target < 0:
+                for origins, last_acceptance in records:
+                    for origin in origins:
+                        entries[origin] = (DEAD_STATE, last_acceptance)
+            elif target in next_live:
+                # Runs that meet with the same last acceptance are the same run from now on
+                target_records = next_live[target]
+                for record in records:
+                    if target_records[-1][1] == record[1]:
+                        target_records[-1][0].extend(record[0])
+                    else:
+                        target_records.append(record)
+            else:
+                next_live[target] = records
+        index += 1
+        for state, records in next_live.items():
+            if acceptance[state]:
+                # Every run in the state accepted here, they share their last acceptance from now on
+                if len(records) > 1:
+                    records[:] = [[[origin for origins, _ in records for origin in origins], -1]]
+                records[0][1] = index + offset
+        live = next_live
+
+    for state, records in live.items():
+        for origins, last_acceptance in records:
+            for origin in origins:
+                entries[origin] = (state, last_acceptance)
+    return entries
+
+
+def speculative_tokens(dfa, text, offset, start, end):
+    """
+    Tokenizes a chunk with maximal munch assuming a token starts at its start
+    :param dfa: compiled DFA
+    :param text: part of the input that begins at offset
+    :param offset: input position of text[0]
+    :param start: chunk start
+    :param end: chunk end
+    :return: (token starts, state of the token still running at end or DEAD_STATE, its last acceptance end)
+    """
+    token_starts = array(POSITION_TYPECODE, [start])
+    position = start
+    while position < end:
+        state, token_end = advance(dfa, text, offset, dfa.initial_state, -1, position, end)
+        if state != DEAD_STATE:
+            return token_starts, state, token_end
+        if token_end < 0:
+            # No token matches at position
+            break
+        token_starts.append(token_end)
+        position = token_end
+    return token_starts, DEAD_STATE, -1
+
+
+def scan_chunk(dfa, text, offset, start, end, exact, tokens, max_entry_states):
+    """
+    Scans one chunk: state map from its possible entry states and, for tokenization, a speculative
+    tokenization
+    :param dfa: compiled DFA
+    :param text: input from offset (lookback) to the chunk end
+    :param offset: input position of text[0]
+    :param start: chunk start
+    :param end: chunk end
+    :param exact: if the lookback begins where matching begins
+    :param tokens: if the speculative tokenization is done
+    :param max_entry_states: most entry states mapped
+    :return: chunk summary
+    """
+    states = entry_states(dfa, text, offset, start, exact, max_entry_states)
+    entries = None if states is None else run_entries(dfa, text, offset, start, end, states)
+    token_starts, pending_state, pending_acceptance = None, DEAD_STATE, -1
+    if tokens:
+        token_starts, pending_state, pending_acceptance = speculative_tokens(dfa, text, offset, start, end)
+    return ChunkSummary(start, end, entries, token_starts, pending_state, pending_acceptance)
+
+
+def scan_chunk_task(task):
+    """
+    Scans a chunk in a pool worker
+    :param task: scan_chunk arguments after the DFA
+    :return: chunk summary
+    """
+    # Read from the module, the pool initializer sets it after this module is imported
+    return scan_chunk(batchMatching.worker_dfa, *task)
+
+
+class ParallelDFA(MatchingEngine):
+    """
+    Matches one large input over a process pool. The input is split in chunks, and each worker maps its
+    chunk from every state the automaton can be in when the chunk starts (found over a short lookback,
+    runs that converge are merged) and tokenizes it speculatively from its start. A sequential pass then
+    composes the state maps and follows each speculative tokenization from the first token start it shares
+    with the real one; tokens the speculation missed are matched sequentially
+    """
+
+    def __init__(self, dfa, workers=None, chunk_size=DEFAULT_PARALLEL_CHUNK_SIZE, lookback=DEFAULT_LOOKBACK,
+                 max_entry_states=DEFAULT_MAX_ENTRY_STATES):
+        if chunk_size < 1:
+            raise ValueError('The chunk size must be at least 1')
+        self.dfa = dfa
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.lookback = lookback
+        self.max_entry_states = max_entry_states
+
+    def longest_match(self, string, start=0):
+        """
+        Finds the longest non-empty accepted prefix of string[start:]
+        :param string: input string
+        :param start: position where the match begins
+        :return: end position of the match, -1 if there is none
+        """
+        return self.dfa.longest_match(string, start)
+
+    def accepts_empty(self):
+        """
+        Checks if the empty string is accepted
+        :return: True if the initial state is an acceptance state
+        """
+        return self.dfa.accepts_empty()
+
+    def is_sequential(self, string, start=0):
+        """
+        Checks if an input is matched sequentially (one worker or a single chunk)
+        :param string: input string
+        :param start: position where matching begins
+        :return: True if the sequential engine is used
+        """
+        return self.workers <= 1 or len(string) - start <= self.chunk_size
+
+    def chunk_tasks(self, string, start, tokens):
+        """
+        Generates the pool tasks of an input lazily, so only the chunks waiting for a worker are copied
+        :param string: input string
+        :param start: position where matching begins
+        :param tokens: if the chunks are tokenized speculatively
+        :return: generator with scan_chunk_task arguments
+        """
+        length = len(string)
+        for chunk_start in range(start, length, self.chunk_size):
+            chunk_end = min(chunk_start + self.chunk_size, length)
+            lookback_start = max(start, chunk_start - self.lookback)
+            yield (string[lookback_start:chunk_end], lookback_start, chunk_start, chunk_end,
+                   lookback_start == start, tokens, self.max_entry_states)
+
+    def scan_chunks(self, string, start, tokens):
+        """
+        Scans the chunks of an input in the process pool
+        :param string: input string
+        :param start: position where matching begins
+        :param tokens: if the chunks are tokenized speculatively
+        :return: generator with the chunk summaries, in input order
+        """
+        chunk_count = -(-(len(string) - start) // self.chunk_size)
+        with batchMatching.dfa_pool(self.dfa, min(self.workers, chunk_count)) as pool:
+            # The task thread of the pool pulls from the generator and blocks while the worker pipe is full
+            yield from pool.imap(scan_chunk_task, self.chunk_tasks(string, start, tokens))
+
+    def resume(self, summary, state, last_acceptance, string):
+        """
+        Continues a run that enters a chunk, with its state map or sequentially if it has none for the state
+        :param summary: chunk summary
+        :param state: state at the chunk start
+        :param last_acceptance: end of the last acceptance so far, -1 if none
+        :param string: input string
+        :return: (state at the chunk end, DEAD_STATE if it died; end of the last acceptance)
+        """
+        entry = summary.entries.get(state) if summary.entries is not None else None
+        if entry is None:
+            return advance(self.dfa, string, 0, state, last_acceptance, summary.start, summary.end)
+        state, chunk_acceptance = entry
+        return state, chunk_acceptance if chunk_acceptance >= 0 else last_acceptance
+
+    def accepts(self, string):
+        """
+        Checks if the whole string belongs to the language, composing the state maps of its chunks
+        :param string: input string
+        :return: True if accepted
+        """
+        if self.is_sequential(string):
+            return self.dfa.accepts(string)
+        state = self.dfa.initial_state
+        for summary in self.scan_chunks(string, 0, False):
+            state, _ = self.resume(summary, state, -1, string)
+            if state == DEAD_STATE:
+                return False
+        return bool(self.dfa.acceptance[state])
+
+    def iter_token_spans(self, string, start=0):
+        """
+        Splits a string in tokens with maximal munch, the same tokens as the sequential engine
+        :param string: string to tokenize
+        :param start: position where tokenization begins
+        :return: iterator with (start, end) spans over string
+        :raises TokenizationError: when no token matches at a position
+        """
+        if self.is_sequential(string, start):
+            return self.dfa.iter_token_spans(string, start)
+        return chain.from_iterable(self.span_batches(string, start))
+
+    def span_batches(self, string, start):
+        """
+        Stitches the chunk summaries into the token spans. Spans are produced in batches, so the tokens of a
+        speculative tokenization are passed on without a Python step per token
+        :param string: string to tokenize
+        :param start: position where tokenization begins
+        :return: generator with iterables of (start, end) spans
+        :raises TokenizationError: when no token matches at a position
+        """
+        longest_match = self.dfa.longest_match
+        position = start
+        # Token that runs into the next chunk: (start, state, end of its last acceptance)
+        pending = None
+        for summary in self.scan_chunks(string, start, True):
+            if pending is not None:
+                token_start, state, last_acceptance = pending
+                state, last_acceptance = self.resume(summary, state, last_acceptance, string)
+                if state != DEAD_STATE:
+                    pending = (token_start, state, last_acceptance)
+                    continue
+                pending = None
+                if last_acceptance < 0:
+                    raise TokenizationError(token_start)
+                yield ((token_start, last_acceptance),)
+                position = last_acceptance
+
+            # Tokens are matched sequentially until one starts where a speculative token starts, from there
+            # both tokenizations are the same
+            token_starts = summary.token_starts
+            index = bisect_left(token_starts, position)
+            while position < summary.end and (index == len(token_starts) or token_starts[index] != position):
+                end = longest_match(string, position)
+                if end < 0:
+                    raise TokenizationError(position)
+                yield ((position, end),)
+                position = end
+                index = bisect_left(token_starts, position)
+            if position >= summary.end:
+                continue
+
+            yield zip(token_starts[index:-1], token_starts[index + 1:])
+            position = token_starts[-1]
+            if summary.pending_state != DEAD_STATE:
+                pending = (position, summary.pending_state, summary.pending_acceptance)
+            elif position < summary.end:
+                raise TokenizationError(position)
+
+        if pending is not None:
+            token_start, _, last_acceptance = pending
+            if last_acceptance < 0:
+                raise TokenizationError(token_start)
+            yield ((token_start, last_acceptance),)
+            position = last_acceptance
+        # The last token can end before the input does
+        length = len(string)
+        while position < length:
+            end = longest_match(string, position)
+            if end < 0:
+                raise TokenizationError(position)
+            yield ((position, end),)
+            position = end
@@ -0,0 +1,382 @@
+"""
+regexParser.py
+Regex parser that builds a simplified syntax tree (AST) with n-ary alternation and concatenation
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from alphabet import tokenize_regex, is_operand, union_character_classes, CharacterClass, Repetition, \
+    RegexSyntaxError, EPSILON
+
+# Precedence of binary operators (higher = higher priority), unary operators are applied as soon as they are read
+BINARY_OPERATORS = {'.': 2, '|': 1}
+UNARY_OPERATORS = ('*', '+')
+OPTIONAL = Repetition(0, 1)
+
+
+class RegexNode(object):
+    """
+    Regex syntax tree node. Operands are leaves (operator None, operand CharacterClass or ε), '*', '+' and
+    Repetition operators have one child and '.' and '|' have two or more. Nodes are shared: equal subtrees
+    are the same node
+    """
+
+    def __init__(self, number, operator, children=(), operand=None, nullable=False):
+        # Number given by the builder, equal nodes have equal numbers
+        self.number = number
+        self.operator = operator
+        self.children = children
+        self.operand = operand
+        # If the node matches the empty string
+        self.nullable = nullable
+        # States of the Thompson NFA of the node, with every repetition expanded
+        self.state_count = self.count_thompson_states()
+
+    def count_thompson_states(self):
+        """
+        Counts the states of the Thompson NFA of the node (CompactNFA.from_postfix)
+        :return: number of states
+        """
+        if self.operator is None:
+            return 2
+        child_states = sum(child.state_count for child in self.children)
+        if self.operator == '.':
+            return child_states
+        if self.operator == '|':
+            return child_states + 2 * (len(self.children) - 1)
+        if self.operator in UNARY_OPERATORS:
+            return child_states + 2
+        # Repetitions: the required copies, then a closure or one gate state per optional copy and an exit
+        minimum, maximum = self.operator.minimum, self.operator.maximum
+        if maximum is None:
+            return max(minimum, 1) * child_states + 2
+        return maximum * child_states + (maximum - minimum + 1 if maximum > minimum else 0)
+
+    def is_epsilon(self):
+        """
+        Checks if the node only matches the empty string
+        :return: True for ε leaves
+        """
+        return self.operator is None and self.operand == EPSILON
+
+    def is_character_class(self):
+        """
+        Checks if the node is a character class leaf
+        :return: True for character class leaves
+        """
+        return isinstance(self.operand, CharacterClass)
+
+    def postfix(self):
+        """
+        Writes the tree in postfix order, n-ary nodes as left associative binary operators (a b . c .)
+        :return: postfix tokens (operators as strings, operands as CharacterClass or ε)
+        """
+        tokens = []
+        # Iterative traversal, (node, next child) pairs
+        pending = [(self, 0)]
+        while pending:
+            node, child = pending.pop()
+            if node.operator is None:
+                tokens.append(node.operand)
+            elif child < len(node.children):
+                if child >= 2:
+                    tokens.append(node.operator)
+                pending.append((node, child + 1))
+                pending.append((node.children[child], 0))
+            else:
+                tokens.append(node.operator)
+        return tokens
+
+    def __str__(self):
+        return ' '.join(str(token) for token in self.postfix())
+
+    def __repr__(self):
+        return f'RegexNode({str(self)})'
+
+
+class RegexTreeBuilder(object):
+    """
+    Builds regex trees bottom-up. Every node is interned, so equal subtrees are found by number, and
+    simplified as it is built (children are already simple):
+    (r*)* = (r+)* = (r*)+ = r*, r+ = r* if r is nullable, (ε|r*|s)* = (r|s)*, (r*.s*)* = (r|s)*,
+    (r*.s*|t)* = (r|s|t)*, r*.r* = r*, r*.r+ = r+.r* = r+, ε.r = r, r|r = r, a|b = [ab], ε|r = r if r is
+    nullable and r? otherwise, (r{0,n})* = (r{1,n})* = r*, r{0,} = r*, r{1,} = r+, (r*){m,n} = r*,
+    (r+)? = r* and r{m,n} = r{n}, r{m,} = r* if r
+    is nullable
+    """
+
+    def __init__(self, simplify=True):
+        self.simplify = simplify
+        self.nodes = {}
+
+    def node(self, operator, children=(), operand=None, nullable=False):
+        """
+        Gets the interned node
+        :param operator: '*', '+', '.', '|' or None for operands
+        :param children: tuple of child nodes
+        :param operand: CharacterClass or ε for operands
+        :param nullable: if the node matches the empty string
+        :return: node
+        """
+        key = (operator, operand, tuple(child.number for child in children))
+        node = self.nodes.get(key)
+        if node is None:
+            node = RegexNode(len(self.nodes), operator, children, operand, nullable)
+            self.nodes[key] = node
+        return node
+
+    def operand(self, token):
+        """
+        Leaf node
+        :param token: CharacterClass or ε
+        :return: node
+        """
+        return self.node(None, operand=token, nullable=token == EPSILON)
+
+    def epsilon(self):
+        """
+        ε leaf
+        :return: node
+        """
+        return self.operand(EPSILON)
+
+    def star(self, child):
+        """
+        Kleene closure node
+        :param child: node
+        :return: node
+        """
+        if self.simplify:
+            if child.is_epsilon():
+                return child
+            if self.repeated_node(child) is not child:
+                return self.star(self.repeated_node(child))
+            if child.operator == '.' and all(factor.nullable for factor in child.children):
+                # Every factor can be skipped, so any sequence of factors can be repeated
+                return self.star(self.alternation(child.children))
+            if child.operator == '|':
+                repeated_options = self.alternation(self.repeated_options(child.children))
+                if repeated_options is not child:
+                    return self.star(repeated_options)
+        return self.node('*', (child,), nullable=True)
+
+    @staticmethod
+    def repeated_node(node):
+        """
+        Gets the simplest node with the same Kleene closure: r for r*, r+, r{0,n} and r{1,n}
+        :param node: node
+        :return: node
+        """
+        if node.operator in UNARY_OPERATORS or (isinstance(node.operator, Repetition) and node.operator.minimum <= 1):
+            return node.children[0]
+        return node
+
+    def repeated_options(self, options):
+        """
+        Simplifies the options of an alternation inside a Kleene closure: ε is dropped, r*, r+ and r{0,n}
+        become r, and nullable concatenations are split in their factors
+        :param options: nodes
+        :return: list of nodes
+        """
+        repeated = []
+        for option in options:
+            if option.is_epsilon():
+                continue
+            if self.repeated_node(option) is not option:
+                repeated.append(self.repeated_node(option))
+            elif option.operator == '.' and option.nullable:
+                repeated.extend(option.children)
+            else:
+                repeated.append(option)
+        return repeated
+
+    def plus(self, child):
+        """
+        Positive closure node
+        :param child: node
+        :return: node
+        """
+        if self.simplify:
+            if child.nullable:
+                return self.star(child)
+            if child.operator == '+':
+                return child
+        return self.node('+', (child,), nullable=child.nullable)
+
+    def repetition(self, child, repetition):
+        """
+        Bounded repetition node
+        :param child: node
+        :param repetition: Repetition
+        :return: node
+        """
+        minimum, maximum = repetition.minimum, repetition.maximum
+        if maximum == 0:
+            return self.epsilon()
+        if minimum == 1 and maximum == 1:
+            return child
+        if self.simplify:
+            if child.is_epsilon() or child.operator == '*':
+                return child
+            if maximum is None and minimum <= 1:
+                return self.star(child) if minimum == 0 else self.plus(child)
+            if child.nullable:
+                # Copies can match the empty string, so exactly maximum copies match the same strings
+                if maximum is None:
+                    return self.star(child)
+                if maximum == 1:
+                    return child
+                minimum = maximum
+            if minimum == 0 and maximum == 1 and child.operator == '+':
+                return self.star(child.children[0])
+        return self.node(Repetition(minimum, maximum), (child,), nullable=minimum == 0 or child.nullable)
+
+    def concatenation(self, factors):
+        """
+        Concatenation node, nested concatenations are flattened
+        :param factors: nodes
+        :return: node
+        """
+        flat_factors = []
+        for factor in factors:
+            for inner_factor in factor.children if factor.operator == '.' else (factor,):
+                if self.simplify:
+                    if inner_factor.is_epsilon():
+                        continue
+                    if flat_factors and self.closure_pair(flat_factors[-1], inner_factor):
+                        previous = flat_factors.pop()
+                        # r*.r* = r*, otherwise one of them is r+ and the pair is r+
+                        if previous.operator == '*' and inner_factor.operator == '*':
+                            inner_factor = previous
+                        else:
+                            inner_factor = self.plus(previous.children[0])
+                flat_factors.append(inner_factor)
+
+        if len(flat_factors) == 0:
+            return self.epsilon()
+        if len(flat_factors) == 1:
+            return flat_factors[0]
+        return self.node('.', tuple(flat_factors), nullable=all(factor.nullable for factor in flat_factors))
+
+    @staticmethod
+    def closure_pair(first, second):
+        """
+        Checks if two nodes are closures of the same node that can be merged (any pair but r+.r+)
+        :param first: node
+        :param second: node
+        :return: True if they can be merged
+        """
+        return first.operator in UNARY_OPERATORS and second.operator in UNARY_OPERATORS and \
+            first.children[0] is second.children[0] and (first.operator == '*' or second.operator == '*')
+
+    def alternation(self, options):
+        """
+        Alternation node, nested alternations are flattened
+        :param options: nodes
+        :return: node
+        """
+        flat_options = []
+        for option in options:
+            flat_options.extend(option.children if option.operator == '|' else (option,))
+
+        if self.simplify:
+            # Repeated options are dropped and character classes are joined in the position of the first one
+            flat_options = list(dict.fromkeys(flat_options))
+            character_classes = [option.operand for option in flat_options if option.is_character_class()]
+            if len(character_classes) > 1:
+                joined_class = self.operand(union_character_classes(character_classes))
+                first_class = next(index for index, option in enumerate(flat_options) if option.is_character_class())
+                flat_options = [option for option in flat_options if not option.is_character_class()]
+                flat_options.insert(first_class, joined_class)
+            if self.epsilon() in flat_options and len(flat_options) > 1:
+                flat_options = [option for option in flat_options if not option.is_epsilon()]
+                if not any(option.nullable for option in flat_options):
+                    # ε|r = r?
+                    return self.repetition(self.alternation(flat_options), OPTIONAL)
+
+        if len(flat_options) == 0:
+            return self.epsilon()
+        if len(flat_options) == 1:
+            return flat_options[0]
+        return self.node('|', tuple(flat_options), nullable=any(option.nullable for option in flat_options))
+
+    def apply(self, operator, operands):
+        """
+        Applies a regex operator
+        :param operator: '*', '+', '?', Repetition, '.' or '|'
+        :param operands: nodes
+        :return: node
+        """
+        if isinstance(operator, Repetition):
+            return self.repetition(operands[0], operator)
+        if operator == '?':
+            return self.repetition(operands[0], OPTIONAL)
+        if operator == '*':
+            return self.star(operands[0])
+        if operator == '+':
+            return self.plus(operands[0])
+        if operator == '.':
+            return self.concatenation(operands)
+        return self.alternation(operands)
+
+
+def parse_regex(regex, simplify=True):
+    """
+    Parses a regex in one pass over its tokens (operator precedence, no recursion)
+    :param regex: regular expression
+    :param simplify: if the algebraic simplifications are applied (flattening is always done)
+    :return: root node
+    :raises RegexSyntaxError: with the position of the first error
+    """
+    builder = RegexTreeBuilder(simplify)
+    tokens = tokenize_regex(regex)
+    if len(tokens) == 0:
+        raise RegexSyntaxError('La expresión regular está vacía', 0)
+
+    # Operand nodes, and pending operators / open parenthesis as [token, position, operand count]. A run of
+    # the same operator (a.b.c) is one entry, so each n-ary node is built once
+    operands, operators = [], []
+    expecting_operand = True
+
+    def reduce_operator():
+        operator, _, operand_count = operators.pop()
+        run_operands = tuple(operands[-operand_count:])
+        del operands[-operand_count:]
+        operands.append(builder.apply(operator, run_operands))
+
+    for position, token in tokens:
+        if is_operand(token) or token == '(':
+            if not expecting_operand:
+                raise RegexSyntaxError('Construcción inválida detectada, recuerde incluir puntos para la '
+                                       'concatenación', position)
+            if token == '(':
+                operators.append([token, position, 0])
+            else:
+                operands.append(builder.operand(token))
+                expecting_operand = False
+        elif expecting_operand:
+            raise RegexSyntaxError('Construcción inválida detectada, falta un operando', position)
+        elif token in UNARY_OPERATORS or token == '?' or isinstance(token, Repetition):
+            operands.append(builder.apply(token, (operands.pop(),)))
+        elif token == ')':
+            while operators and operators[-1][0] != '(':
+                reduce_operator()
+            if not operators:
+                raise RegexSyntaxError('Paréntesis de cierre sin apertura', position)
+            operators.pop()
+        else:
+            while operators and BINARY_OPERATORS.get(operators[-1][0], 0) > BINARY_OPERATORS[token]:
+                reduce_operator()
+            if operators and operators[-1][0] == token:
+                operators[-1][2] += 1
+            else:
+                operators.append([token, position, 2])
+            expecting_operand = True
+
+    if expecting_operand:
+        raise RegexSyntaxError('Construcción inválida detectada, la expresión regular no puede terminar en un '
+                               'operador', len(regex))
+    while operators:
+        if operators[-1][0] == '(':
+            raise RegexSyntaxError('Paréntesis de apertura sin cierre', operators[-1][1])
+        reduce_operator()
+    return operands.pop()
@@ -0,0 +1,157 @@
+"""
+streamTokenizer.py
+Incremental (streaming) maximal munch tokenizer over chunked input and file objects
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+from automaton import AutomatonGeneration
+from compiledAutomaton import CompiledDFA, TokenizationError
+from lexer import Lexer
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+class StreamTokenizer(object):
+    """
+    Tokenizes input that arrives in chunks. The DFA state and the pending (not yet final) token are kept
+    between chunks, so memory is bounded by the longest token instead of the input size.
+    Tokens are (rule name, start, end, text), the rule name is None for single pattern automatons
+    """
+
+    def __init__(self, automaton):
+        if isinstance(automaton, Lexer):
+            self.dfa = automaton.dfa
+            self.rule_names = automaton.rule_names
+        else:
+            if isinstance(automaton, CompiledDFA):
+                self.dfa = automaton
+            elif automaton.is_deterministic:
+                self.dfa = automaton.compile()
+            else:
+                self.dfa = AutomatonGeneration().convert_to_dfa(automaton).compile()
+            self.rule_names = None
+        self.buffer = ''
+        self.offset = 0
+        self.state = self.dfa.initial_state
+        self.scanned = 0
+        self.last_acceptance = -1
+        self.last_rule = -1
+        self.closed = False
+
+    def feed(self, chunk):
+        """
+        Adds input and gets the tokens that became final
+        :param chunk: next part of the input
+        :return: list of tokens
+        :raises TokenizationError: when no token matches at a position (tokens found before are in error.tokens)
+        """
+        if self.closed:
+            raise ValueError('The stream tokenizer is closed')
+        self.buffer += chunk
+        return self.scan(False)
+
+    def close(self):
+        """
+        Ends the input and gets the remaining tokens
+        :return: list of tokens
+        :raises TokenizationError: when the pending input is not a token
+        """
+        if self.closed:
+            return []
+        tokens = self.scan(True)
+        self.closed = True
+        return tokens
+
+    def scan(self, final):
+        """
+        Advances the DFA over the buffered input, a token is final when the DFA dies or the input ends
+        :param final: if the input ended
+        :return: list of tokens
+        """
+        dfa = self.dfa
+        transitions = dfa.transitions
+        acceptance = dfa.acceptance
+        acceptance_rules = dfa.acceptance_rules if self.rule_names is not None else None
+        symbol_codes = dfa.symbol_codes
+        width = dfa.symbol_count
+
+        tokens = []
+        buffer = self.buffer
+        state = self.state
+        position = self.scanned
+        last_acceptance = self.last_acceptance
+        last_rule = self.last_rule
+        # Start of the current token in the buffer, the tokens before it are dropped once per scan
+        token_start = 0
+
+        while True:
+            dead = False
+            while position < len(buffer):
+                code = symbol_codes[buffer[position]]
+                if code is None:
+                    dead = True
+                    break
+                state = transitions[state * width + code]
+                if state < 0:
+                    dead = True
+                    break
+                position += 1
+                if acceptance_rules is not None:
+                    if acceptance_rules[state] >= 0:
+                        last_acceptance = position
+                        last_rule = acceptance_rules[state]
+                elif acceptance[state]:
+                    last_acceptance = position
+
+            # The token can still grow with the next chunk
+            if not dead and (not final or token_start == len(buffer)):
+                break
+
+            if last_acceptance < 0:
+                self.buffer, self.state, self.scanned = buffer[token_start:], dfa.initial_state, 0
+                self.last_acceptance = self.last_rule = -1
+                error = TokenizationError(self.offset)
+                error.tokens = tokens
+                raise error
+
+            rule_name = self.rule_names[last_rule] if self.rule_names is not None else None
+            token_end = self.offset + last_acceptance - token_start
+            tokens.append((rule_name, self.offset, token_end, buffer[token_start:last_acceptance]))
+            # The characters read after the token are scanned again from the initial state
+            self.offset = token_end
+            token_start = last_acceptance
+            state = dfa.initial_state
+            position = token_start
+            last_acceptance = -1
+            last_rule = -1
+
+        self.buffer = buffer[token_start:]
+        self.state = state
+        self.scanned = position - token_start
+        self.last_acceptance = last_acceptance - token_start if last_acceptance >= 0 else -1
+        self.last_rule = last_rule
+        return tokens
+
+
+def tokenize_chunks(automaton, chunks):
+    """
+    Pulls tokens from an iterable of text chunks
+    :param automaton: automaton, compiled DFA or Lexer
+    :param chunks: iterable of strings
+    :return: generator with (rule name, start, end, text)
+    """
+    stream_tokenizer = StreamTokenizer(automaton)
+    for chunk in chunks:
+        yield from stream_tokenizer.feed(chunk)
+    yield from stream_tokenizer.close()
+
+
+def tokenize_file(automaton, file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Pulls tokens from a text file object, reading it in chunks
+    :param automaton: automaton, compiled DFA or Lexer
+    :param file: text file object
+    :param chunk_size: characters read at a time
+    :return: generator with (rule name, start, end, text)
+    """
+    return tokenize_chunks(automaton, iter(lambda: file.read(chunk_size), ''))
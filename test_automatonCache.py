@@ -0,0 +1,44 @@
+"""
+test_automatonCache.py
+Statistics recorded through the automaton cache
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+import unittest
+from automatonCache import AutomatonCache, compile_regex, THOMPSON_NFA, SUBSET_DFA
+from automatonStats import AutomatonStats
+
+
+class AutomatonCacheStatsTest(unittest.TestCase):
+
+    def test_cache_hits_count_epsilon_closures(self):
+        cache = AutomatonCache()
+        first_stats = AutomatonStats()
+        second_stats = AutomatonStats()
+        # The first lookup only builds, so the closures of the match are computed on the cache hit
+        cache.get('(a|b)*.c', THOMPSON_NFA, stats=first_stats)
+        cache.get('(a|b)*.c', THOMPSON_NFA, stats=second_stats).match_tokens('abc')
+
+        self.assertEqual(second_stats.counters.get('cache_hits'), 1)
+        self.assertGreater(second_stats.counters.get('epsilon_closures', 0), 0)
+        self.assertEqual(second_stats.counters.get('characters_matched'), 3)
+
+    def test_subset_build_counts_epsilon_closures(self):
+        stats = AutomatonStats()
+        valid, tokens = compile_regex('x.(y|z)*', SUBSET_DFA, stats=stats).match_tokens('xyz')
+
+        self.assertTrue(valid)
+        self.assertGreater(stats.counters.get('epsilon_closures', 0), 0)
+        self.assertEqual(stats.counters.get('tokens_matched'), len(tokens))
+
+    def test_cached_automaton_keeps_no_stats(self):
+        cache = AutomatonCache()
+        cache.get('a.b', THOMPSON_NFA, stats=AutomatonStats())
+        automaton = cache.get('a.b', THOMPSON_NFA)
+
+        self.assertIsNone(automaton.stats)
+        self.assertIsNone(automaton.matching_engine().automaton.stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,361 @@
+"""
+tokenizationServer.py
+Asyncio tokenization service (line delimited JSON over TCP or Unix sockets) with request micro-batching
+Pablo Ruiz 18259 (PingMaster99)
+
+Protocol: one JSON object per line in both directions. Requests are answered in completion order, the
+response carries the id of its request
+    {"id": 1, "pattern": "(a|b)*.c", "input": "abc"}  ->  {"id": 1, "valid": true, "tokens": ["abc"]}
+    {"id": 2, "op": "stats"}                          ->  {"id": 2, "stats": {...}}
+    errors                                            ->  {"id": 3, "error": "..."}
+"""
+
+import asyncio
+import json
+from time import perf_counter
+from automatonCache import AutomatonCache, SUBSET_DFA
+from automatonStats import ExponentialHistogram
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# A batch is run when it has this many requests or when its oldest request waited this long
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_BATCH_DELAY = 0.002
+# Requests read but not answered yet (all connections), reading stops while the limit is reached
+DEFAULT_MAX_PENDING = 1024
+# Longest request line in bytes
+DEFAULT_LINE_LIMIT = 1 << 20
+# Histogram buckets start at 10 microseconds for latencies and at 1 request for batch sizes
+SMALLEST_LATENCY = 0.00001
+
+
+def match_batch(automaton, strings):
+    """
+    Matches a batch of strings with one automaton (runs in the executor)
+    :param automaton: automaton
+    :param strings: list of strings
+    :return: list with match_tokens results
+    """
+    match_tokens = automaton.match_tokens
+    return [match_tokens(string) for string in strings]
+
+
+class PendingBatch(object):
+    """
+    Requests for one pattern waiting to be matched together
+    """
+
+    def __init__(self, timer):
+        self.strings = []
+        self.futures = []
+        # Scheduled flush of the batch
+        self.timer = timer
+
+
+class TokenizationServer(object):
+    """
+    Serves match_tokens requests. Concurrent requests for the same pattern (from any connection) are
+    coalesced into micro-batches: the pattern is compiled once (shared automaton cache) and the batch is
+    matched in an executor, so the event loop keeps reading while batches run
+    """
+
+    def __init__(self, method=SUBSET_DFA, minimize=False, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 batch_delay=DEFAULT_BATCH_DELAY, max_pending=DEFAULT_MAX_PENDING, executor=None, cache=None):
+        self.method = method
+        self.minimize = minimize
+        self.max_batch_size = max_batch_size
+        self.batch_delay = batch_delay
+        self.max_pending = max_pending
+        # None uses the default executor of the loop (a thread pool)
+        self.executor = executor
+        self.cache = cache if cache is not None else AutomatonCache()
+        self.batches = {}
+        # Running batch tasks, referenced until they finish so the loop cannot collect them midway
+        self.flush_tasks = set()
+        self.pending_slots = None
+        self.server = None
+        self.latency = ExponentialHistogram(SMALLEST_LATENCY)
+        self.batch_sizes = ExponentialHistogram(1)
+        self.errors = 0
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        """
+        Starts listening
+        :param host: TCP host
+        :param port: TCP port (0 picks a free one, see address)
+        :param path: Unix socket path, used instead of TCP when given
+        :return: asyncio server
+        """
+        self.pending_slots = asyncio.Semaphore(self.max_pending)
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path, limit=DEFAULT_LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port, limit=DEFAULT_LINE_LIMIT)
+        return self.server
+
+    def address(self):
+        """
+        Address the server listens on
+        :return: (host, port) for TCP, socket path for Unix sockets
+        """
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        """
+        Stops listening and waits for the server to close
+        """
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Reads the requests of a connection. Each request is answered by its own task so pipelined requests
+        can share batches; once max_pending requests are in flight the connections stop reading, which pushes
+        back on the clients through the socket buffers
+        :param reader: stream reader
+        :param writer: stream writer
+        """
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    # Line over the limit or connection reset
+                    break
+                if not line:
+                    break
+                # Idle connections hold no slot, a connection waiting here stops reading
+                await self.pending_slots.acquire()
+                task = asyncio.create_task(self.answer(line, perf_counter(), writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def answer(self, line, start, writer, write_lock):
+        """
+        Answers one request line
+        :param line: request bytes
+        :param start: time the request was read
+        :param writer: stream writer
+        :param write_lock: lock of the connection writer
+        """
+        try:
+            response = await self.respond(line)
+            if 'error' in response:
+                self.errors += 1
+            async with write_lock:
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+            self.latency.record(perf_counter() - start)
+        except ConnectionError:
+            pass
+        finally:
+            self.pending_slots.release()
+
+    async def respond(self, line):
+        """
+        Builds the response of a request
+        :param line: request bytes
+        :return: response dictionary
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('A request must be a JSON object')
+        except ValueError as error:
+            return {'id': None, 'error': f'Invalid request: {error}'}
+
+        response = {'id': request.get('id')}
+        operation = request.get('op', 'match')
+        try:
+            if operation == 'match':
+                pattern, string = request.get('pattern'), request.get('input')
+                if not isinstance(pattern, str) or not isinstance(string, str):
+                    raise ValueError('A match request needs a pattern and an input string')
+                response['valid'], response['tokens'] = await self.submit(pattern, string)
+            elif operation == 'stats':
+                response['stats'] = self.statistics()
+            else:
+                raise ValueError(f'Unknown operation {operation}')
+        except ValueError as error:
+            response['error'] = str(error)
+        return response
+
+    async def submit(self, pattern, string):
+        """
+        Matches a string, batched with the other pending requests of the same pattern
+        :param pattern: regular expression
+        :param string: input string
+        :return: match_tokens result
+        :raises ValueError: if the pattern is invalid or over the state budget
+        """
+        loop = asyncio.get_running_loop()
+        batch = self.batches.get(pattern)
+        if batch is None:
+            batch = PendingBatch(loop.call_later(self.batch_delay, self.flush, pattern))
+            self.batches[pattern] = batch
+        future = loop.create_future()
+        batch.strings.append(string)
+        batch.futures.append(future)
+        if len(batch.strings) >= self.max_batch_size:
+            self.flush(pattern)
+        return await future
+
+    def flush(self, pattern):
+        """
+        Starts matching the pending batch of a pattern
+        :param pattern: regular expression
+        """
+        batch = self.batches.pop(pattern, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self.batch_sizes.record(len(batch.strings))
+        task = asyncio.get_running_loop().create_task(self.run_batch(pattern, batch))
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    async def run_batch(self, pattern, batch):
+        """
+        Compiles the pattern (cached) and matches a batch in the executor
+        :param pattern: regular expression
+        :param batch: pending batch
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            automaton = await loop.run_in_executor(self.executor, self.cache.get, pattern, self.method,
+                                                   self.minimize)
+            results = await loop.run_in_executor(self.executor, match_batch, automaton, batch.strings)
+        except Exception as error:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(error if isinstance(error, ValueError) else ValueError(str(error)))
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def statistics(self):
+        """
+        Service statistics
+        :return: dictionary with the latency and batch size histograms, errors and cache counters
+        """
+        return {'latency_seconds': self.latency.as_dict(), 'batch_size': self.batch_sizes.as_dict(),
+                'errors': self.errors, 'pending_batches': len(self.batches), 'cache': self.cache.statistics()}
+
+
+class TokenizationClient(object):
+    """
+    Client of the tokenization service. Requests can be sent concurrently over one connection, responses
+    are matched to their requests by id
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.waiting = {}
+        self.receiver = asyncio.create_task(self.receive())
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        """
+        Connects to a server
+        :param host: TCP host
+        :param port: TCP port
+        :param path: Unix socket path, used instead of TCP when given
+        :return: client
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path, limit=DEFAULT_LINE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=DEFAULT_LINE_LIMIT)
+        return cls(reader, writer)
+
+    async def receive(self):
+        """
+        Reads responses and resolves the requests waiting for them
+        """
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.waiting.pop(response.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('The connection was closed'))
+            self.waiting.clear()
+
+    async def request(self, message):
+        """
+        Sends a request and waits for its response
+        :param message: request dictionary (its id is set by the client)
+        :return: response dictionary
+        """
+        if self.receiver.done():
+            raise ConnectionError('The connection was closed')
+        self.next_id += 1
+        message = dict(message, id=self.next_id)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[self.next_id] = future
+        self.writer.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        return await future
+
+    async def match_tokens(self, pattern, string):
+        """
+        Matches a string remotely
+        :param pattern: regular expression
+        :param string: input string
+        :return: (valid, tokens) like FiniteAutomaton.match_tokens
+        :raises ValueError: with the error of the server
+        """
+        response = await self.request({'pattern': pattern, 'input': string})
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['valid'], response['tokens']
+
+    async def statistics(self):
+        """
+        Gets the statistics of the server
+        :return: statistics dictionary
+        """
+        return (await self.request({'op': 'stats'}))['stats']
+
+    async def close(self):
+        """
+        Closes the connection
+        """
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await asyncio.gather(self.receiver, return_exceptions=True)
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, on_ready=None, **server_options):
+    """
+    Runs a tokenization server until it is cancelled
+    :param host: TCP host
+    :param port: TCP port
+    :param path: Unix socket path, used instead of TCP when given
+    :param on_ready: optional function called with the server once it listens
+    :param server_options: TokenizationServer options
+    """
+    server = TokenizationServer(**server_options)
+    await server.start(host, port, path)
+    if on_ready is not None:
+        on_ready(server)
+    async with server.server:
+        await server.server.serve_forever()
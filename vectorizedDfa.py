@@ -0,0 +1,103 @@
+"""
+vectorizedDfa.py
+NumPy vectorized DFA execution for batches of strings (optional, needs numpy)
+Pablo Ruiz 18259 (PingMaster99)
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMPY_MISSING_MESSAGE = 'The vectorized executor needs NumPy (pip install numpy)'
+
+
+class VectorizedDFA(object):
+    """
+    Runs a compiled DFA over a whole batch of strings at once: the batch is a padded (strings x characters)
+    symbol matrix, and every column advances the vector of current states with a single gather into the
+    transition table
+    """
+
+    def __init__(self, automaton):
+        if np is None:
+            raise ImportError(NUMPY_MISSING_MESSAGE)
+        dfa = automaton.compile() if hasattr(automaton, 'compile') else automaton
+        self.dfa = dfa
+        width = dfa.symbol_count
+        state_count = dfa.state_count
+
+        # Extra row: sink for the dead state. Extra columns: characters without a class (always dead)
+        # and padding after the end of a string (keeps the state)
+        self.sink_state = state_count
+        self.dead_code = width
+        self.padding_code = width + 1
+        table = np.full((state_count + 1, width + 2), self.sink_state, dtype=np.int32)
+        transitions = np.asarray(dfa.transitions, dtype=np.int32).reshape(state_count, width)
+        table[:state_count, :width] = np.where(transitions < 0, self.sink_state, transitions)
+        table[:, self.padding_code] = np.arange(state_count + 1, dtype=np.int32)
+        self.table = table
+        self.acceptance = np.zeros(state_count + 1, dtype=bool)
+        self.acceptance[:state_count] = np.frombuffer(bytes(dfa.acceptance), dtype=np.uint8) != 0
+
+        # Code point segments of the symbol classes, used to classify a batch with one searchsorted
+        symbol_classes = dfa.symbol_classes
+        self.boundaries = np.array(symbol_classes.boundaries, dtype=np.uint32)
+        self.segment_codes = np.array([self.dead_code if code is None else code
+                                       for code in symbol_classes.segment_codes], dtype=np.int32)
+
+    def encode(self, strings):
+        """
+        Encodes a batch of strings as a padded matrix of symbol class codes
+        :param strings: list of strings
+        :return: (symbol matrix, string lengths)
+        """
+        lengths = np.fromiter((len(string) for string in strings), dtype=np.int64, count=len(strings))
+        width = int(lengths.max()) if len(strings) > 0 else 0
+        symbols = np.full((len(strings), width), self.padding_code, dtype=np.int32)
+        if width == 0:
+            return symbols, lengths
+
+        code_points = np.frombuffer(''.join(strings).encode('utf-32-le'), dtype=np.uint32)
+        codes = self.segment_codes[np.searchsorted(self.boundaries, code_points, side='right') - 1]
+        # Row major order of the mask matches the order of the joined characters
+        symbols[np.arange(width) < lengths[:, None]] = codes
+        return symbols, lengths
+
+    def run(self, strings):
+        """
+        Checks which strings belong to the language
+        :param strings: list of strings
+        :return: (boolean accept array, position of the character that reached the dead state in each
+                 string, -1 if it never died)
+        """
+        strings = list(strings)
+        symbols, lengths = self.encode(strings)
+        # One contiguous row per character position, and row offsets instead of states in the flat table
+        columns = np.ascontiguousarray(symbols.T)
+        row_width = self.table.shape[1]
+        table = (self.table * row_width).ravel()
+        sink_row = self.sink_state * row_width
+        rows = np.full(len(strings), self.dfa.initial_state * row_width, dtype=np.int32)
+        dead_positions = np.full(len(strings), -1, dtype=np.int64)
+        alive = len(strings)
+
+        for column in range(columns.shape[0]):
+            rows = table[rows + columns[column]]
+            newly_dead = (rows == sink_row) & (dead_positions < 0)
+            if newly_dead.any():
+                dead_positions[newly_dead] = column
+                alive -= int(np.count_nonzero(newly_dead))
+                if alive == 0:
+                    break
+        return self.acceptance[rows // row_width], dead_positions
+
+
+def accepts_many(automaton, strings):
+    """
+    Vectorized acceptance check of a batch of strings
+    :param automaton: deterministic FiniteAutomaton or CompiledDFA
+    :param strings: list of strings
+    :return: (boolean accept array, first dead position of each string, -1 if it never died)
+    """
+    return VectorizedDFA(automaton).run(strings)